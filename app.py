@@ -20,6 +20,41 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = db_url or 'sqlite:///lucky_lubricant.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
+    # Processes used to render QR images for batch downloads (1 = render inline)
+    app.config['QR_RENDER_WORKERS'] = int(os.getenv('QR_RENDER_WORKERS', os.cpu_count() or 1))
+    # Rendered QR images are cached on disk under UPLOAD_FOLDER (LRU, size-capped)
+    app.config['QR_CACHE_MAX_BYTES'] = int(os.getenv('QR_CACHE_MAX_MB', 512)) * 1024 * 1024
+    # Marker files used to signal data changes between gunicorn workers
+    app.config['SHARED_STATE_DIR'] = os.getenv('SHARED_STATE_DIR', os.path.join(app.instance_path, 'state'))
+    # In-memory Bloom filter of issued QR uuids, used to reject fake codes early
+    app.config['QR_FILTER_ENABLED'] = os.getenv('QR_FILTER_ENABLED', '1') == '1'
+    app.config['QR_FILTER_FP_RATE'] = float(os.getenv('QR_FILTER_FP_RATE', 0.001))
+    # Admin alerts are batch-inserted by a background writer (NOTIFY_ASYNC=0 writes inline)
+    app.config['NOTIFY_ASYNC'] = os.getenv('NOTIFY_ASYNC', '1') == '1'
+    app.config['NOTIFY_FLUSH_MS'] = int(os.getenv('NOTIFY_FLUSH_MS', 250))
+    app.config['NOTIFY_BATCH_SIZE'] = int(os.getenv('NOTIFY_BATCH_SIZE', 200))
+    app.config['NOTIFY_QUEUE_SIZE'] = int(os.getenv('NOTIFY_QUEUE_SIZE', 10000))
+    app.config['NOTIFY_OVERFLOW'] = os.getenv('NOTIFY_OVERFLOW', 'sync') # sync | block | drop
+    # Per-worker request metrics snapshots, merged by /admin/metrics
+    app.config['METRICS_DIR'] = os.getenv('METRICS_DIR', os.path.join(app.instance_path, 'metrics'))
+    # Optional bearer token so a Prometheus scraper can read /admin/metrics without a session
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    # Dashboard counters snapshot lifetime (writes invalidate it sooner)
+    app.config['DASHBOARD_CACHE_SECONDS'] = int(os.getenv('DASHBOARD_CACHE_SECONDS', 15))
+    # SQL accounting: warn when one request repeats a statement this often (N+1)
+    app.config['QUERY_REPEAT_WARN'] = int(os.getenv('QUERY_REPEAT_WARN', 10))
+    app.config['QUERY_STATS_HEADERS'] = os.getenv('QUERY_STATS_HEADERS', 'false').lower() == 'true'
+    # Daily rollups: refresh period and how far behind "now" the high-water mark stays
+    app.config['ROLLUP_REFRESH_SECONDS'] = int(os.getenv('ROLLUP_REFRESH_SECONDS', 60))
+    app.config['ROLLUP_LAG_SECONDS'] = int(os.getenv('ROLLUP_LAG_SECONDS', 120))
+    # Ledger reconciliation: transactions younger than this wait for the next run
+    app.config['LEDGER_LAG_SECONDS'] = int(os.getenv('LEDGER_LAG_SECONDS', 120))
+    # Idempotency-Key replays: how long responses are kept, and how long a
+    # reservation whose request never finished blocks retries
+    app.config['IDEMPOTENCY_TTL_SECONDS'] = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 86400))
+    app.config['IDEMPOTENCY_LOCK_SECONDS'] = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 60))
+    if os.getenv('QUERY_BUDGET_ENFORCE'):
+        app.config['QUERY_BUDGET_ENFORCE'] = os.getenv('QUERY_BUDGET_ENFORCE').lower() == 'true'
 
     # Ensure upload directory exists
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
@@ -28,7 +63,9 @@ def create_app():
     db.init_app(app)
     
     # CORS Configuration - Fully Permissive
-    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+    # (response headers the app reads are exposed for browser clients)
+    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True,
+         expose_headers=['X-Next-Cursor', 'Idempotent-Replayed'])
 
     login_manager = LoginManager()
     login_manager.login_view = 'admin_routes.admin_login'
@@ -55,12 +92,12 @@ def create_app():
 
     @app.context_processor
     def inject_notifications():
-        from models import Notification, WebsiteContact
-        count = Notification.query.filter_by(is_admin_alert=True, is_read=False).count()
-        unread_website_contacts = WebsiteContact.query.filter_by(is_read=False).count()
+        # Lazy: the counters are only read if the template renders a badge
+        from werkzeug.local import LocalProxy
+        from services.counters import unread_counts, UNREAD_ADMIN_ALERTS, UNREAD_WEBSITE_CONTACTS
         return dict(
-            unread_admin_notifications_count=count,
-            unread_website_contacts_count=unread_website_contacts
+            unread_admin_notifications_count=LocalProxy(lambda: unread_counts()[UNREAD_ADMIN_ALERTS]),
+            unread_website_contacts_count=LocalProxy(lambda: unread_counts()[UNREAD_WEBSITE_CONTACTS])
         )
 
     @app.route('/uploads/<filename>')
@@ -75,6 +112,25 @@ def create_app():
 
     with app.app_context():
         db.create_all()
+        from services.counters import seed_unread_counters
+        seed_unread_counters()
+
+    from services import shared_state
+    from services.qr_bloom import qr_filter
+    from services.notifications import notification_writer
+    from services.metrics import request_metrics
+    from services.dashboard import dashboard_stats
+    from services import user_search
+    from services.query_stats import query_stats
+    from services.rollups import rollups
+    shared_state.init_app(app)
+    qr_filter.init_app(app)
+    notification_writer.init_app(app)
+    request_metrics.init_app(app)
+    dashboard_stats.init_app(app)
+    user_search.init_app(app)
+    query_stats.init_app(app)
+    rollups.init_app(app)
 
     return app
 
@@ -0,0 +1,14 @@
+from app import create_app
+from services.rollups import rollups
+
+# Rebuilds the daily rollup tables (per batch, per reward, per state) from the
+# full history in transactions, qr_codes, users and redemption_requests.
+# Run once after migrate_db.py creates the tables; afterwards each worker
+# keeps them current from the high-water mark.
+
+app = create_app()
+
+if __name__ == '__main__':
+    with app.app_context():
+        rows = rollups.rebuild()
+        print(f"Rollups rebuilt ({rows} daily rows written).")
@@ -0,0 +1,167 @@
+import argparse
+import json
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from sqlalchemy import select, func, delete
+from app import create_app
+from models import db, User, Reward, RedemptionRequest, Transaction
+from services import ledger
+
+# Concurrency benchmark for /api/rewards/redeem. Creates a reward with limited
+# stock and a set of users who can each afford exactly one unit, then fires
+# all redeemers at once (every user appears more than once when concurrency
+# exceeds users) and checks that nothing was oversold and no balance went
+# negative, printing throughput and latency.
+#
+#   python bench_redeem.py                       # in-process, against DATABASE_URL
+#   python bench_redeem.py --url http://127.0.0.1:5000   # a running server (same database)
+#
+# The benchmark rows are deleted afterwards unless --keep is given.
+
+app = create_app()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent redeem benchmark")
+    parser.add_argument('--concurrency', type=int, default=200, help="parallel redeemers")
+    parser.add_argument('--users', type=int, default=100, help="distinct users among the redeemers")
+    parser.add_argument('--stock', type=int, default=50, help="units of the reward on offer")
+    parser.add_argument('--cost', type=int, default=100, help="points per unit")
+    parser.add_argument('--url', help="base URL of a running server instead of the in-process app")
+    parser.add_argument('--keep', action='store_true', help="leave the benchmark rows in the database")
+    return parser.parse_args()
+
+
+def setup(args, tag):
+    users = [User(name=f"Bench {i}", phone=f"b{tag}-{i}", password_hash='-', points=args.cost)
+             for i in range(args.users)]
+    reward = Reward(name=f"Bench reward {tag}", points_required=args.cost, stock=args.stock)
+    db.session.add_all(users + [reward])
+    db.session.commit()
+    return [u.id for u in users], reward.id
+
+
+def post_in_process(client, payload):
+    response = client.post('/api/rewards/redeem', json=payload)
+    return response.status_code, (response.get_json() or {}).get('message')
+
+
+def post_http(base_url, payload):
+    req = urllib.request.Request(f"{base_url.rstrip('/')}/api/rewards/redeem",
+                                 data=json.dumps(payload).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            return response.status, json.loads(response.read()).get('message')
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}').get('message')
+
+
+def run(args, user_ids, reward_id):
+    barrier = threading.Barrier(args.concurrency)
+    outcomes = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def redeemer(i):
+        payload = {'user_id': user_ids[i % len(user_ids)], 'reward_id': reward_id}
+        client = None if args.url else app.test_client()
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            status, message = post_http(args.url, payload) if args.url else post_in_process(client, payload)
+        except Exception as e:
+            status, message = 'error', type(e).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            outcomes[(status, message)] += 1
+            latencies.append(elapsed)
+
+    threads = [threading.Thread(target=redeemer, args=(i,)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    return outcomes, sorted(latencies), time.perf_counter() - started
+
+
+def verify(args, user_ids, reward_id):
+    # Returns a list of failed invariants
+    db.session.expire_all()
+    stock = db.session.execute(select(Reward.stock).where(Reward.id == reward_id)).scalar()
+    sold = db.session.execute(
+        select(func.count(RedemptionRequest.id)).where(RedemptionRequest.reward_id == reward_id)).scalar()
+    spends = db.session.execute(
+        select(func.count(Transaction.id))
+        .where(Transaction.user_id.in_(user_ids), Transaction.type == 'spend')).scalar()
+    balances = dict(db.session.execute(select(User.id, User.points).where(User.id.in_(user_ids))).all())
+    per_user = Counter(dict(db.session.execute(
+        select(RedemptionRequest.user_id, func.count(RedemptionRequest.id))
+        .where(RedemptionRequest.reward_id == reward_id)
+        .group_by(RedemptionRequest.user_id)).all()))
+
+    failures = []
+    if stock < 0:
+        failures.append(f"stock went negative ({stock})")
+    if sold + stock != args.stock:
+        failures.append(f"sold {sold} + remaining {stock} != initial stock {args.stock}")
+    if sold > min(args.stock, args.users):
+        failures.append(f"sold {sold}, at most {min(args.stock, args.users)} possible")
+    if spends != sold:
+        failures.append(f"{spends} spend transactions for {sold} redemptions")
+    negative = [uid for uid, points in balances.items() if points < 0]
+    if negative:
+        failures.append(f"{len(negative)} users with a negative balance")
+    wrong = [uid for uid in user_ids if balances[uid] != args.cost - args.cost * per_user[uid]]
+    if wrong:
+        failures.append(f"{len(wrong)} users whose balance does not match their redemptions")
+    return sold, stock, failures
+
+
+def cleanup(user_ids, reward_id):
+    db.session.execute(delete(RedemptionRequest).where(RedemptionRequest.reward_id == reward_id))
+    db.session.execute(delete(Transaction).where(Transaction.user_id.in_(user_ids)))
+    for user_id in user_ids:
+        ledger.drop_user(user_id)
+    # ORM deletes so the user search index drops them too
+    for user in User.query.filter(User.id.in_(user_ids)):
+        db.session.delete(user)
+    db.session.execute(delete(Reward).where(Reward.id == reward_id))
+    db.session.commit()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0.0
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with app.app_context():
+        user_ids, reward_id = setup(args, secrets.token_hex(3))
+        db.session.remove()
+    try:
+        outcomes, latencies, elapsed = run(args, user_ids, reward_id)
+        with app.app_context():
+            sold, stock, failures = verify(args, user_ids, reward_id)
+    finally:
+        if not args.keep:
+            with app.app_context():
+                cleanup(user_ids, reward_id)
+
+    print(f"{args.concurrency} redeemers, {args.users} users, stock {args.stock}, "
+          f"{'server ' + args.url if args.url else 'in-process'}")
+    for (status, message), count in outcomes.most_common():
+        print(f"  {count:5d}  {status} {message}")
+    print(f"Sold {sold}, remaining stock {stock}")
+    print(f"{args.concurrency / elapsed:.1f} req/s over {elapsed:.2f}s; latency p50 {percentile(latencies, 0.5):.1f} ms, "
+          f"p95 {percentile(latencies, 0.95):.1f} ms, max {percentile(latencies, 1.0):.1f} ms")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK: no overselling, no negative balances, ledger matches")
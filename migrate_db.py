@@ -0,0 +1,44 @@
+from app import create_app
+from models import db
+from sqlalchemy import inspect, text
+
+# Brings an existing database up to date with models.py: creates missing
+# tables, adds missing columns and creates missing indexes. Safe to re-run.
+
+app = create_app()
+
+
+def add_missing_columns():
+    inspector = inspect(db.engine)
+    added = 0
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=db.engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            print(f"Adding column {table.name}.{column.name}")
+            with db.engine.begin() as conn:
+                conn.execute(text(ddl))
+            added += 1
+    return added
+
+
+def create_missing_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        added = add_missing_columns()
+        create_missing_indexes()
+        print(f"Migration completed successfully ({added} columns added).")
@@ -13,6 +13,8 @@ class Admin(db.Model, UserMixin):
 
 class User(db.Model):
     __tablename__ = 'users'
+    # Keyset pagination order (services/pagination.py)
+    __table_args__ = (db.Index('ix_users_created_at_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20), unique=True, nullable=False)
@@ -44,15 +46,28 @@ class Reward(db.Model):
 
 class QRBatch(db.Model):
     __tablename__ = 'qr_batches'
+    __table_args__ = (db.Index('ix_qr_batches_created_at_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     batch_name = db.Column(db.String(100), nullable=False)
     total_qrs = db.Column(db.Integer, nullable=False)
     total_points = db.Column(db.Integer, nullable=False)
+    # Maintained by the scan path; rebuilt by repair_counters.py
+    redeemed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    redeemed_points = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     qrs = db.relationship('QRCode', backref='batch', lazy=True)
 
+    @property
+    def available_count(self):
+        return self.total_qrs - self.redeemed_count
+
 class QRCode(db.Model):
     __tablename__ = 'qr_codes'
+    # Batch analytics group a batch's redeemed codes by redeemed_at; rollups scan by redeemed_at
+    __table_args__ = (
+        db.Index('ix_qr_codes_batch_redeemed_at', 'batch_id', 'is_redeemed', 'redeemed_at'),
+        db.Index('ix_qr_codes_redeemed_at', 'redeemed_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     batch_id = db.Column(db.Integer, db.ForeignKey('qr_batches.id'), nullable=False)
     uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
@@ -63,15 +78,23 @@ class QRCode(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        db.Index('ix_transactions_user_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_transactions_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     amount = db.Column(db.Integer, nullable=False)
-    type = db.Column(db.String(20)) # 'earn' or 'spend'
+    type = db.Column(db.String(20)) # 'earn', 'spend' or 'refund'
     description = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class RedemptionRequest(db.Model):
     __tablename__ = 'redemption_requests'
+    __table_args__ = (
+        db.Index('ix_redemption_requests_created_at_id', 'created_at', 'id'),
+        db.Index('ix_redemption_requests_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     reward_id = db.Column(db.Integer, db.ForeignKey('rewards.id'), nullable=False)
@@ -83,6 +106,10 @@ class RedemptionRequest(db.Model):
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_admin_unread', 'is_admin_alert', 'is_read', 'created_at', 'id'),
+        db.Index('ix_notifications_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     title = db.Column(db.String(100))
@@ -109,6 +136,7 @@ class Order(db.Model):
 
 class SupportMessage(db.Model):
     __tablename__ = 'support_messages'
+    __table_args__ = (db.Index('ix_support_messages_created_at_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     subject = db.Column(db.String(100))
@@ -119,6 +147,7 @@ class SupportMessage(db.Model):
 
 class WebsiteContact(db.Model):
     __tablename__ = 'website_contacts'
+    __table_args__ = (db.Index('ix_website_contacts_created_at_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     full_name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=False)
@@ -127,3 +156,81 @@ class WebsiteContact(db.Model):
     message = db.Column(db.Text)
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Counter(db.Model):
+    # Named counters kept in step with their source tables (see services/counters.py),
+    # plus the ledger reconciliation watermark (services/ledger.py)
+    __tablename__ = 'counters'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+# Daily rollups maintained by services/rollups.py from a high-water mark
+class DailyBatchStat(db.Model):
+    __tablename__ = 'daily_batch_stats'
+    day = db.Column(db.Date, primary_key=True)
+    batch_id = db.Column(db.Integer, primary_key=True)
+    scans = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    points = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class DailyRewardStat(db.Model):
+    __tablename__ = 'daily_reward_stats'
+    day = db.Column(db.Date, primary_key=True)
+    reward_id = db.Column(db.Integer, primary_key=True)
+    requests = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    points = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class DailyStateStat(db.Model):
+    __tablename__ = 'daily_state_stats'
+    day = db.Column(db.Date, primary_key=True)
+    state = db.Column(db.String(100), primary_key=True)
+    scans = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    points_earned = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    points_spent = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    new_users = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class RollupState(db.Model):
+    __tablename__ = 'rollup_state'
+    name = db.Column(db.String(50), primary_key=True)
+    high_water = db.Column(db.DateTime, nullable=False)
+
+# Ledger reconciliation (services/ledger.py): each user's balance summed from
+# transactions up to the watermark, and the users whose points disagree with it
+class BalanceSnapshot(db.Model):
+    __tablename__ = 'balance_snapshots'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    balance = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    through_transaction_id = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LedgerDrift(db.Model):
+    __tablename__ = 'ledger_drift'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    stored_points = db.Column(db.Integer, nullable=False)
+    ledger_points = db.Column(db.Integer, nullable=False)
+    drift = db.Column(db.Integer, nullable=False)
+    first_seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ReconciliationRun(db.Model):
+    __tablename__ = 'reconciliation_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    from_transaction_id = db.Column(db.Integer, nullable=False)
+    to_transaction_id = db.Column(db.Integer, nullable=False)
+    transactions = db.Column(db.Integer, nullable=False, default=0)
+    users_updated = db.Column(db.Integer, nullable=False, default=0)
+    drifted_users = db.Column(db.Integer, nullable=False, default=0)
+    total_drift = db.Column(db.Integer, nullable=False, default=0)
+
+# Idempotency-Key replay store (services/idempotency.py). The key is kept as a
+# sha256 of endpoint + client key; status_code is NULL while the first request
+# is still running. Rows older than IDEMPOTENCY_TTL_SECONDS are purged.
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (db.Index('ix_idempotency_keys_created_at', 'created_at'),)
+    key_hash = db.Column(db.String(64), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)
+    body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
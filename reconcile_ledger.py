@@ -0,0 +1,24 @@
+import sys
+from app import create_app
+from services import ledger
+
+# Folds new transactions into the per-user balance snapshots and reports
+# users whose points disagree with the ledger. Incremental: each run reads
+# only the transactions since the previous one, so schedule it from cron
+# (e.g. every 15 minutes). --rebuild drops the snapshots and refolds the
+# whole ledger; the first run does that implicitly.
+
+app = create_app()
+
+if __name__ == '__main__':
+    with app.app_context():
+        run = ledger.rebuild() if '--rebuild' in sys.argv else ledger.reconcile()
+        print(f"Transactions {run.from_transaction_id + 1}..{run.to_transaction_id}: "
+              f"{run.transactions} folded into {run.users_updated} user snapshots.")
+        if not run.drifted_users:
+            print("No drift: every user's points match the ledger.")
+        else:
+            print(f"Drift on {run.drifted_users} users ({run.total_drift} points in total):")
+            for row in ledger.report(limit=50)['drift']:
+                print(f"  user {row['user_id']} {row['name']} ({row['phone']}): "
+                      f"points {row['stored_points']}, ledger {row['ledger_points']}, drift {row['drift']:+d}")
@@ -0,0 +1,18 @@
+from app import create_app
+from services.counters import recompute_batch_counters, recompute_unread_counters
+from services import user_search
+
+# Recomputes the denormalized counters from their source tables.
+# Run after migrate_db.py, or whenever a counter is suspected to have drifted.
+
+app = create_app()
+
+if __name__ == '__main__':
+    with app.app_context():
+        batches = recompute_batch_counters()
+        print(f"Batch redemption counters rebuilt for {batches} batches.")
+        recompute_unread_counters()
+        print("Unread notification and website contact counters rebuilt.")
+        indexed = user_search.rebuild()
+        if indexed:
+            print(f"User search index rebuilt for {indexed} users.")
@@ -1,17 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, Response, stream_with_context, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from models import db, Admin, User, Product, Reward, QRBatch, QRCode, RedemptionRequest, Transaction, Notification, SupportMessage, WebsiteContact
-import qrcode
+from services.qr_batches import generate_batch
+from services.qr_export import stream_zip, batch_image_entries, zip_compression
+from services.exports import export, parse_day, ExportError
+from services.qr_render import make_settings
+from services.qr_cache import cache_root, drop_batch
+from services.qr_bloom import qr_filter
+from services.metrics import request_metrics
+from services.dashboard import dashboard_stats, COLD_QUERIES
+from services.pagination import paginate, page_size
+from services import user_search
+from services.user_profile import profile_summary
+from services.batch_analytics import batch_analytics
+from services.rollups import rollups
+from services import ledger
+from services import redemptions as redemption_queue
+from services.query_stats import query_budget
+from services import counters
+from services.counters import adjust_counter, unread_counts, UNREAD_ADMIN_ALERTS, UNREAD_WEBSITE_CONTACTS, UNREAD_SUPPORT_MESSAGES
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
 import os
-import uuid
-import random
-import zipfile
-from io import BytesIO
 from datetime import datetime
 
 admin_bp = Blueprint('admin_routes', __name__)
 
+DASHBOARD_NOTIFICATIONS = 20
+
+def qr_cache_root():
+    return os.path.abspath(cache_root(current_app.config['UPLOAD_FOLDER']))
+
 @admin_bp.route('/login', methods=['GET', 'POST'])
 def admin_login():
     if request.method == 'POST':
@@ -32,42 +52,69 @@ def logout():
 
 @admin_bp.route('/dashboard')
 @login_required
+@query_budget(5 + COLD_QUERIES)
 def dashboard():
-    from models import Order, SupportMessage
-    user_count = User.query.count()
-    product_count = Product.query.count()
-    reward_count = Reward.query.count()
-    batch_count = QRBatch.query.count()
-    pending_redemptions = RedemptionRequest.query.filter_by(status='pending').count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    unread_messages = SupportMessage.query.filter_by(is_read=False).count()
-    unread_website_contacts = WebsiteContact.query.filter_by(is_read=False).count()
+    # Counters and recent activity come from a cached snapshot (one round trip when stale)
+    stats = dashboard_stats.get()
     
     # New: Admin Notifications
-    notifications = Notification.query.filter_by(is_admin_alert=True, is_read=False).order_by(Notification.created_at.desc()).all()
-    
-    # Recent Transactions for dashboard (Scans and Redemptions)
-    recent_scans = QRCode.query.filter_by(is_redeemed=True).order_by(QRCode.redeemed_at.desc()).limit(5).all()
-    recent_redemptions = RedemptionRequest.query.order_by(RedemptionRequest.created_at.desc()).limit(5).all()
+    notifications = paginate(
+        Notification.query.filter_by(is_admin_alert=True, is_read=False), Notification,
+        per_page=page_size(default=DASHBOARD_NOTIFICATIONS), after_arg='notif_after', before_arg='notif_before')
     
     return render_template('dashboard.html', 
-                           user_count=user_count, 
-                           product_count=product_count, 
-                           reward_count=reward_count, 
-                           batch_count=batch_count,
-                           pending_redemptions=pending_redemptions,
-                           pending_orders=pending_orders,
-                           unread_messages=unread_messages,
-                           unread_website_contacts=unread_website_contacts,
+                           user_count=stats.user_count, 
+                           product_count=stats.product_count, 
+                           reward_count=stats.reward_count, 
+                           batch_count=stats.batch_count,
+                           pending_redemptions=stats.pending_redemptions,
+                           pending_orders=stats.pending_orders,
+                           unread_messages=stats.unread_messages,
+                           unread_website_contacts=stats.unread_website_contacts,
                            notifications=notifications,
-                           recent_scans=recent_scans,
-                           recent_redemptions=recent_redemptions)
+                           recent_scans=stats.recent_scans,
+                           recent_redemptions=stats.recent_redemptions,
+                           activity=stats.activity,
+                           top_states=stats.top_states,
+                           stats_age=stats.age_seconds)
+
+@admin_bp.route('/stats/daily')
+@login_required
+@query_budget(6)
+def daily_stats():
+    # Report data straight from the daily rollup tables
+    days = max(1, min(request.args.get('days', 30, type=int), 366))
+    rollups.ensure_refreshing()
+    return jsonify({
+        "days": days,
+        "activity": rollups.daily_activity(days=days),
+        "states": rollups.top_states(days=days, limit=50),
+        "rewards": rollups.reward_totals(days=days),
+        "batches": rollups.batch_daily(days=days),
+    })
+
+@admin_bp.route('/ledger/report')
+@login_required
+@query_budget(4)
+def ledger_report():
+    # Latest reconciliation run and the users whose points disagree with the ledger
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify(ledger.report(limit=limit))
+
+@admin_bp.route('/metrics')
+def metrics():
+    # Admin session, or a scraper presenting METRICS_TOKEN as a bearer token
+    token = current_app.config.get('METRICS_TOKEN')
+    bearer = request.headers.get('Authorization', '')
+    if not current_user.is_authenticated and not (token and bearer == f"Bearer {token}"):
+        return current_app.login_manager.unauthorized()
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @admin_bp.route('/notification/<int:notif_id>/read', methods=['POST'])
 @login_required
 def mark_notification_read(notif_id):
-    notif = Notification.query.get_or_404(notif_id)
-    notif.is_read = True
+    Notification.query.get_or_404(notif_id)
+    counters.mark_notification_read(notif_id)
     db.session.commit()
     return jsonify({"success": True})
 
@@ -100,6 +147,7 @@ def goodies_admin():
         )
         db.session.add(new_reward)
         db.session.commit()
+        dashboard_stats.invalidate()
         flash('New Goodie added successfully!')
         return redirect(url_for('admin_routes.goodies_admin'))
         
@@ -117,6 +165,7 @@ def delete_goodie(reward_id):
     
     db.session.delete(reward)
     db.session.commit()
+    dashboard_stats.invalidate()
     flash(f"Goodie '{reward.name}' removed.")
     return redirect(url_for('admin_routes.goodies_admin'))
 
@@ -180,6 +229,7 @@ def products_admin():
         )
         db.session.add(new_product)
         db.session.commit()
+        dashboard_stats.invalidate()
         flash('Product added successfully!')
         return redirect(url_for('admin_routes.products_admin'))
         
@@ -198,48 +248,81 @@ def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
     db.session.delete(product)
     db.session.commit()
+    dashboard_stats.invalidate()
     flash(f"Product '{product.name}' deleted successfully.")
     return redirect(url_for('admin_routes.products_admin'))
 
 @admin_bp.route('/users')
 @login_required
+@query_budget(5)
 def users_list():
-    query = User.query
-    
-    # Filtering
-    name = request.args.get('name')
-    phone = request.args.get('phone')
-    city = request.args.get('city')
-    state = request.args.get('state')
-    
-    if name:
-        query = query.filter(User.name.ilike(f"%{name}%"))
-    if phone:
-        query = query.filter(User.phone.ilike(f"%{phone}%"))
-    if city:
-        query = query.filter(User.city.ilike(f"%{city}%"))
-    if state:
-        query = query.filter(User.state.ilike(f"%{state}%"))
-        
-    users = query.all()
+    # Quick search: best matches first, from the search index
+    q = request.args.get('q', '').strip()
+    if q:
+        matches = user_search.search_users(q, limit=page_size())
+        return render_template('users.html', users=matches, searching=True)
+
+    # Filtering (indexed prefix / phone-suffix matching, see services/user_search.py)
+    query = user_search.filter_users(
+        User.query,
+        name=request.args.get('name'),
+        phone=request.args.get('phone'),
+        city=request.args.get('city'),
+        state=request.args.get('state'),
+    )
+    users = paginate(query, User)
     return render_template('users.html', users=users)
 
 @admin_bp.route('/user/<int:user_id>')
 @login_required
+@query_budget(5)
 def user_profile(user_id):
     user = User.query.get_or_404(user_id)
-    # Fetch related data
-    transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.created_at.desc()).all()
-    redemptions = RedemptionRequest.query.filter_by(user_id=user_id).order_by(RedemptionRequest.created_at.desc()).all()
-    
-    # Notifications/Messages (using Notification model if exists)
-    messages = Notification.query.filter_by(user_id=user_id).order_by(Notification.created_at.desc()).all()
+    # Totals only; the history tabs load pages from the JSON endpoints below
+    return render_template('user_profile.html', user=user, summary=profile_summary(user_id),
+                           credit_types=['earn', ledger.REFUND])
+
+def _history_page(page, serialize):
+    return jsonify({"items": [serialize(item) for item in page.items], "next": page.next_cursor})
+
+@admin_bp.route('/user/<int:user_id>/transactions')
+@login_required
+@query_budget(3)
+def user_transactions(user_id):
+    page = paginate(Transaction.query.filter_by(user_id=user_id), Transaction)
+    return _history_page(page, lambda tx: {
+        "id": tx.id,
+        "type": tx.type,
+        "amount": tx.amount,
+        "description": tx.description,
+        "date": tx.created_at.strftime("%Y-%m-%d %H:%M"),
+    })
+
+@admin_bp.route('/user/<int:user_id>/redemptions')
+@login_required
+@query_budget(3)
+def user_redemptions(user_id):
+    query = RedemptionRequest.query.options(joinedload(RedemptionRequest.reward)).filter_by(user_id=user_id)
+    page = paginate(query, RedemptionRequest)
+    return _history_page(page, lambda r: {
+        "id": r.id,
+        "reward": r.reward.name,
+        "points": r.reward.points_required,
+        "status": r.status,
+        "date": r.created_at.strftime("%Y-%m-%d %H:%M"),
+    })
 
-    return render_template('user_profile.html', 
-                           user=user, 
-                           transactions=transactions, 
-                           redemptions=redemptions,
-                           messages=messages)
+@admin_bp.route('/user/<int:user_id>/messages')
+@login_required
+@query_budget(3)
+def user_messages(user_id):
+    page = paginate(Notification.query.filter_by(user_id=user_id), Notification)
+    return _history_page(page, lambda m: {
+        "id": m.id,
+        "title": m.title,
+        "message": m.message,
+        "date": m.created_at.strftime("%Y-%m-%d %H:%M"),
+    })
 
 @admin_bp.route('/user/<int:user_id>/delete', methods=['POST'])
 @login_required
@@ -248,10 +331,14 @@ def delete_user(user_id):
     # Delete related records (cleanup)
     Transaction.query.filter_by(user_id=user_id).delete()
     RedemptionRequest.query.filter_by(user_id=user_id).delete()
+    unread_alerts = Notification.query.filter_by(user_id=user_id, is_admin_alert=True, is_read=False).count()
     Notification.query.filter_by(user_id=user_id).delete()
+    adjust_counter(UNREAD_ADMIN_ALERTS, -unread_alerts)
+    ledger.drop_user(user_id)
     
     db.session.delete(user)
     db.session.commit()
+    dashboard_stats.invalidate()
     
     flash(f"User '{user.name}' and all associated data deleted successfully.")
     return redirect(url_for('admin_routes.users_list'))
@@ -263,81 +350,103 @@ def qr_management():
         batch_name = request.form.get('batch_name')
         qr_size = int(request.form.get('qr_size')) # e.g. 100
         
-        # Batch generation logic
-        new_batch = QRBatch(batch_name=batch_name, total_qrs=qr_size, total_points=0)
-        db.session.add(new_batch)
-        db.session.flush() # Get batch ID
-
-        total_batch_points = 0
-        
-        # 50% (10-30 points)
-        count_50 = int(qr_size * 0.5)
-        # 40% (31-50 points)
-        count_40 = int(qr_size * 0.4)
-        # 10% (51-80 points)
-        count_10 = qr_size - count_50 - count_40
-        
-        distributions = [
-            (count_50, 10, 30),
-            (count_40, 31, 50),
-            (count_10, 51, 80)
-        ]
-
-        for count, min_p, max_p in distributions:
-            for _ in range(count):
-                pts = random.randint(min_p, max_p)
-                qr = QRCode(batch_id=new_batch.id, points=pts, uuid=str(uuid.uuid4()))
-                db.session.add(qr)
-                total_batch_points += pts
-        
-        new_batch.total_points = total_batch_points
-        db.session.commit()
+        # Bulk generation: chunked multi-row INSERTs, no per-code ORM objects
+        new_batch = generate_batch(batch_name, qr_size, on_chunk=qr_filter.add_codes)
+        qr_filter.batch_created(new_batch.id)
+        dashboard_stats.invalidate()
         flash('QR Batch generated successfully')
         return redirect(url_for('admin_routes.qr_management'))
 
-    batches = QRBatch.query.order_by(QRBatch.created_at.desc()).all()
-    # Add stats to each batch object for display
-    for b in batches:
-        b.redeemed_count = QRCode.query.filter_by(batch_id=b.id, is_redeemed=True).count()
-        b.available_count = b.total_qrs - b.redeemed_count
-    return render_template('qr_management.html', batches=batches)
+    # redeemed_count/available_count come from the maintained batch counters
+    batches = paginate(QRBatch.query, QRBatch)
+    return render_template('qr_management.html', batches=batches, filter_stats=qr_filter.stats())
 
 @admin_bp.route('/qr-batch/<int:batch_id>/download')
 @login_required
 def download_qr_zip(batch_id):
     batch = QRBatch.query.get_or_404(batch_id)
-    qrs = QRCode.query.filter_by(batch_id=batch_id).all()
     
-    memory_file = BytesIO()
-    with zipfile.ZipFile(memory_file, 'w') as zf:
-        for qr in qrs:
-            # Generate QR Image
-            img = qrcode.make(qr.uuid)
-            img_io = BytesIO()
-            img.save(img_io, 'PNG')
-            img_io.seek(0)
-            zf.writestr(f"qr_{qr.id}_{qr.points}pts.png", img_io.getvalue())
-            
-    memory_file.seek(0)
-    return send_file(memory_file, download_name=f"batch_{batch.batch_name}.zip", as_attachment=True)
+    # Stream the archive: rows come off a server-side cursor and each PNG is
+    # sent as soon as it is rendered instead of building the zip in memory.
+    # Rendering fans out over a process pool in ordered chunks and reuses
+    # images already in the on-disk QR cache.
+    settings = make_settings(request.args.get('format'),
+                             request.args.get('box_size', type=int),
+                             request.args.get('border', type=int))
+    entries = batch_image_entries(batch_id, settings,
+                                  workers=current_app.config['QR_RENDER_WORKERS'],
+                                  cache_root=qr_cache_root(),
+                                  cache_max_bytes=current_app.config['QR_CACHE_MAX_BYTES'])
+    response = Response(stream_with_context(stream_zip(entries, zip_compression(settings))), mimetype='application/zip')
+    response.headers.set('Content-Disposition', 'attachment', filename=f"batch_{batch.batch_name}.zip")
+    return response
+
+def _export_response(dataset, **filters):
+    # Rows are streamed off a server-side cursor straight into the response
+    try:
+        chunks, mimetype, filename = export(
+            dataset, request.args.get('format', 'csv'),
+            start=parse_day(request.args.get('start')),
+            end=parse_day(request.args.get('end')),
+            **filters)
+    except ExportError as e:
+        flash(str(e))
+        return redirect(request.referrer or url_for('admin_routes.dashboard'))
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    return response
+
+@admin_bp.route('/qr-batch/<int:batch_id>/export')
+@login_required
+def export_batch_codes(batch_id):
+    QRBatch.query.get_or_404(batch_id)
+    return _export_response('batch-codes', batch_id=batch_id)
+
+@admin_bp.route('/export/users')
+@login_required
+def export_users():
+    # batch_id narrows to users who scanned a code from that batch
+    return _export_response('users', batch_id=request.args.get('batch_id', type=int))
+
+@admin_bp.route('/export/transactions')
+@login_required
+def export_transactions():
+    return _export_response('transactions')
+
+@admin_bp.route('/export/redemptions')
+@login_required
+def export_redemptions():
+    # batch_id narrows to redemptions by users who scanned a code from that batch
+    return _export_response('redemptions', status=request.args.get('status') or None,
+                            batch_id=request.args.get('batch_id', type=int))
 
 @admin_bp.route('/qr-batch/<int:batch_id>')
 @login_required
+@query_budget(9)
 def batch_details(batch_id):
     batch = QRBatch.query.get_or_404(batch_id)
-    # Get stats
-    total_qrs = len(batch.qrs)
-    redeemed_qrs = QRCode.query.filter_by(batch_id=batch_id, is_redeemed=True).count()
-    pending_qrs = total_qrs - redeemed_qrs
+    # Get stats (maintained counters, no per-code scan)
+    redeemed_qrs = batch.redeemed_count
+    pending_qrs = batch.available_count
     
     # Get recent scans in this batch
     recent_scans = QRCode.query.filter_by(batch_id=batch_id, is_redeemed=True).order_by(QRCode.redeemed_at.desc()).limit(10).all()
     
+    analytics = batch_analytics(batch, request.args.get('granularity', 'day'))
+    
     return render_template('batch_details.html', 
                            batch=batch, 
                            redeemed=redeemed_qrs, 
                            pending=pending_qrs,
-                           recent_scans=recent_scans)
+                           recent_scans=recent_scans,
+                           analytics=analytics)
+
+@admin_bp.route('/qr-batch/<int:batch_id>/analytics')
+@login_required
+@query_budget(8)
+def batch_analytics_api(batch_id):
+    batch = QRBatch.query.get_or_404(batch_id)
+    return jsonify(batch_analytics(batch, request.args.get('granularity', 'day')))
 
 @admin_bp.route('/qr-batch/<int:batch_id>/delete', methods=['POST'])
 @login_required
@@ -349,47 +458,105 @@ def delete_batch(batch_id):
     
     # Delete all QRs in batch first
     QRCode.query.filter_by(batch_id=batch_id).delete()
+    rollups.drop_batch(batch_id)
     db.session.delete(batch)
     db.session.commit()
+    drop_batch(qr_cache_root(), batch_id)
+    qr_filter.batch_deleted()
+    dashboard_stats.invalidate()
     
     flash(f"Batch '{batch.batch_name}' deleted successfully.")
     return redirect(url_for('admin_routes.qr_management'))
 
 @admin_bp.route('/redemptions')
 @login_required
+# 4 for the page, plus the dashboard stats when their cache is cold
+@query_budget(4 + COLD_QUERIES)
 def redemptions_list():
-    requests = RedemptionRequest.query.order_by(RedemptionRequest.created_at.desc()).all()
-    return render_template('redemptions.html', requests=requests)
+    query = RedemptionRequest.query.options(joinedload(RedemptionRequest.user), joinedload(RedemptionRequest.reward))
+    requests = paginate(query, RedemptionRequest)
+    # For the bulk-by-filter reward picker
+    rewards = db.session.execute(select(Reward.id, Reward.name).order_by(Reward.name)).all()
+    return render_template('redemptions.html', requests=requests, rewards=rewards,
+                           pending_count=dashboard_stats.get().pending_redemptions)
 
 @admin_bp.route('/redemption/<int:req_id>/approve', methods=['POST'])
 @login_required
 def approve_redemption(req_id):
-    req = RedemptionRequest.query.get_or_404(req_id)
-    req.status = 'approved'
-    db.session.commit()
-    flash('Redemption approved')
+    RedemptionRequest.query.get_or_404(req_id)
+    summary = redemption_queue.process('approve', ids=[req_id])
+    dashboard_stats.invalidate()
+    flash('Redemption approved' if summary['processed'] else 'Redemption was already processed')
     return redirect(url_for('admin_routes.redemptions_list'))
 
 @admin_bp.route('/redemption/<int:req_id>/reject', methods=['POST'])
 @login_required
 def reject_redemption(req_id):
-    req = RedemptionRequest.query.get_or_404(req_id)
-    req.status = 'rejected'
-    # Refund points
-    user = User.query.get(req.user_id)
-    reward = Reward.query.get(req.reward_id)
-    user.points += reward.points_required
-    reward.stock += 1
-    
-    db.session.commit()
-    flash('Redemption rejected and points refunded')
+    RedemptionRequest.query.get_or_404(req_id)
+    # Refunds points (with a ledger entry) and restocks; a request that is no
+    # longer pending is left alone so it is never refunded twice
+    summary = redemption_queue.process('reject', ids=[req_id])
+    dashboard_stats.invalidate()
+    flash('Redemption rejected and points refunded' if summary['processed'] else 'Redemption was already processed')
     return redirect(url_for('admin_routes.redemptions_list'))
 
+@admin_bp.route('/redemptions/bulk', methods=['POST'])
+@login_required
+def bulk_redemptions():
+    # Approve or reject many pending requests at once: the ticked ids, or
+    # every pending request matching reward/date filters (scope=filter;
+    # all=1 with no filters for the whole queue).
+    # Accepts a form post (flash + redirect) or JSON (summary returned).
+    data = request.get_json(silent=True) if request.is_json else request.form
+    if not isinstance(data, dict) and request.is_json:
+        return _bulk_result({"error": "Invalid JSON body"}, 400)
+    action = data.get('action')
+    if action not in redemption_queue.ACTIONS:
+        return _bulk_result({"error": "action must be 'approve' or 'reject'"}, 400)
+    try:
+        if data.get('scope') == 'filter':
+            summary = redemption_queue.process(
+                action,
+                reward_id=int(data.get('reward_id')) if data.get('reward_id') else None,
+                start=parse_day(data.get('start')),
+                end=parse_day(data.get('end')),
+                all_pending=data.get('all') in (True, '1', 'true'))
+        else:
+            ids = data.get('ids') if request.is_json else request.form.getlist('ids')
+            if request.is_json and ids is not None and not (
+                    isinstance(ids, list) and all(isinstance(i, (int, str)) and not isinstance(i, bool) for i in ids)):
+                return _bulk_result({"error": "ids must be a list of redemption request ids"}, 400)
+            ids = [int(i) for i in ids or []]
+            if not ids:
+                return _bulk_result({"error": "No redemption requests selected"}, 400)
+            summary = redemption_queue.process(action, ids=ids)
+    except (TypeError, ValueError) as e:
+        return _bulk_result({"error": str(e)}, 400)
+    dashboard_stats.invalidate()
+    return _bulk_result(summary, 200)
+
+def _bulk_result(result, status):
+    if request.is_json:
+        return jsonify(result), status
+    if 'error' in result:
+        flash(result['error'])
+    else:
+        verb = 'approved' if result['action'] == 'approve' else 'rejected'
+        message = f"{result['processed']} redemptions {verb}"
+        if result['action'] == 'reject':
+            message += (f", {result['points_refunded']} pts refunded to {result['users']} customers"
+                        f" and {result['stock_restored']} items restocked")
+        if result['skipped']:
+            message += f" ({result['skipped']} already processed, skipped)"
+        flash(message)
+    return redirect(request.referrer or url_for('admin_routes.redemptions_list'))
+
 @admin_bp.route('/support-messages')
 @login_required
+@query_budget(6)
 def messages_admin():
-    messages = SupportMessage.query.order_by(SupportMessage.created_at.desc()).all()
-    unread_count = sum(1 for m in messages if not m.is_read)
+    messages = paginate(SupportMessage.query.options(joinedload(SupportMessage.user)), SupportMessage)
+    unread_count = unread_counts()[UNREAD_SUPPORT_MESSAGES]
     return render_template('messages_admin.html', messages=messages, unread_count=unread_count)
 
 @admin_bp.route('/support-message/<int:msg_id>')
@@ -397,24 +564,36 @@ def messages_admin():
 def view_message(msg_id):
     msg = SupportMessage.query.get_or_404(msg_id)
     if not msg.is_read:
-        msg.is_read = True
+        # Conditional so two admins opening it at once decrement the badge only once
+        flipped = db.session.execute(
+            update(SupportMessage)
+            .where(SupportMessage.id == msg_id, SupportMessage.is_read == False)
+            .values(is_read=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        adjust_counter(UNREAD_SUPPORT_MESSAGES, -flipped)
         db.session.commit()
+        dashboard_stats.invalidate()
     return render_template('message_view.html', message=msg)
 
 @admin_bp.route('/support-message/<int:msg_id>/delete', methods=['POST'])
 @login_required
 def delete_message(msg_id):
     msg = SupportMessage.query.get_or_404(msg_id)
+    if not msg.is_read:
+        adjust_counter(UNREAD_SUPPORT_MESSAGES, -1)
     db.session.delete(msg)
     db.session.commit()
+    dashboard_stats.invalidate()
     flash('Message deleted.')
     return redirect(url_for('admin_routes.messages_admin'))
 
 @admin_bp.route('/website-contacts')
 @login_required
+@query_budget(6)
 def website_contacts():
-    contacts = WebsiteContact.query.order_by(WebsiteContact.created_at.desc()).all()
-    unread_count = WebsiteContact.query.filter_by(is_read=False).count()
+    contacts = paginate(WebsiteContact.query, WebsiteContact)
+    unread_count = unread_counts()[UNREAD_WEBSITE_CONTACTS]
     return render_template('website_contacts.html', contacts=contacts, unread_count=unread_count)
 
 @admin_bp.route('/website-contact/<int:contact_id>')
@@ -422,15 +601,26 @@ def website_contacts():
 def view_website_contact(contact_id):
     contact = WebsiteContact.query.get_or_404(contact_id)
     if not contact.is_read:
-        contact.is_read = True
+        # Conditional so two admins opening it at once decrement the badge only once
+        flipped = db.session.execute(
+            update(WebsiteContact)
+            .where(WebsiteContact.id == contact_id, WebsiteContact.is_read == False)
+            .values(is_read=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        adjust_counter(UNREAD_WEBSITE_CONTACTS, -flipped)
         db.session.commit()
+        dashboard_stats.invalidate()
     return render_template('website_contact_view.html', contact=contact)
 
 @admin_bp.route('/website-contact/<int:contact_id>/delete', methods=['POST'])
 @login_required
 def delete_website_contact(contact_id):
     contact = WebsiteContact.query.get_or_404(contact_id)
+    if not contact.is_read:
+        adjust_counter(UNREAD_WEBSITE_CONTACTS, -1)
     db.session.delete(contact)
     db.session.commit()
+    dashboard_stats.invalidate()
     flash('Website contact request deleted.')
     return redirect(url_for('admin_routes.website_contacts'))
@@ -3,6 +3,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from models import db, User
 import os
 from werkzeug.utils import secure_filename
+from services.notifications import notification_writer
+from services.dashboard import dashboard_stats
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -50,16 +52,14 @@ def register():
         password_hash=generate_password_hash(password)
     )
     db.session.add(new_user)
+    db.session.commit()
+    dashboard_stats.invalidate()
     
-    # Create Admin Notification
-    from models import Notification
-    admin_alert = Notification(
+    # Admin Notification (written in the background)
+    notification_writer.enqueue(
         title="New User Registered",
-        message=f"New customer {name} ({phone}) has joined from {city}, {state}.",
-        is_admin_alert=True
+        message=f"New customer {name} ({phone}) has joined from {city}, {state}."
     )
-    db.session.add(admin_alert)
-    db.session.commit()
 
     return jsonify({"message": "User registered successfully"}), 201
 
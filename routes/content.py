@@ -1,5 +1,10 @@
 from flask import Blueprint, request, jsonify
 from models import db, Notification, Banner
+from services.notifications import notification_writer
+from services.dashboard import dashboard_stats
+from services.query_stats import query_budget
+from services.pagination import api_page, cursor_headers
+from services.counters import adjust_counter, mark_notification_read, UNREAD_WEBSITE_CONTACTS
 
 content_bp = Blueprint('content', __name__)
 
@@ -25,7 +30,7 @@ def website_contact():
     if not all([full_name, email, number, message]):
         return jsonify({"message": "Missing required fields"}), 400
         
-    from models import WebsiteContact, Notification
+    from models import WebsiteContact
     new_contact = WebsiteContact(
         full_name=full_name,
         email=email,
@@ -34,22 +39,24 @@ def website_contact():
         message=message
     )
     db.session.add(new_contact)
+    adjust_counter(UNREAD_WEBSITE_CONTACTS, 1)
+    db.session.commit()
+    dashboard_stats.invalidate()
     
-    # Create admin notification
-    admin_notif = Notification(
+    # Admin notification (written in the background)
+    notification_writer.enqueue(
         title="New Website Contact",
-        message=f"Received a new contact form submission from {full_name}",
-        is_admin_alert=True
+        message=f"Received a new contact form submission from {full_name}"
     )
-    db.session.add(admin_notif)
-    
-    db.session.commit()
     return jsonify({"message": "Contact request submitted successfully"}), 201
 
 @content_bp.route('/notifications', methods=['GET'])
+@query_budget(2)
 def notifications():
     user_id = request.args.get('user_id')
-    notes = Notification.query.filter_by(user_id=user_id).order_by(Notification.created_at.desc()).all()
+    query = db.session.query(Notification.id, Notification.title, Notification.message,
+                             Notification.is_read, Notification.created_at).filter(Notification.user_id == user_id)
+    page = api_page(query, Notification)
     
     return jsonify([{
         "id": n.id,
@@ -57,13 +64,11 @@ def notifications():
         "message": n.message,
         "is_read": n.is_read,
         "date": n.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    } for n in notes]), 200
+    } for n in page]), 200, cursor_headers(page)
 
 @content_bp.route('/notifications/<int:id>/read', methods=['PATCH'])
 def mark_read(id):
-    note = Notification.query.get(id)
-    if note:
-        note.is_read = True
+    if mark_notification_read(id):
         db.session.commit()
     return jsonify({"message": "Notification marked as read"}), 200
 
@@ -1,5 +1,13 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import select
 from models import db, Reward, RedemptionRequest, User, Transaction
+from services.scans import debit_points
+from services.redemptions import take_stock
+from services.notifications import notification_writer
+from services.dashboard import dashboard_stats
+from services.query_stats import query_budget
+from services.pagination import api_page, cursor_headers
+from services.idempotency import idempotent
 
 rewards_bp = Blueprint('rewards', __name__)
 
@@ -18,37 +26,46 @@ def list_rewards():
     } for r in rewards]), 200
 
 @rewards_bp.route('/redeem', methods=['POST'])
+@idempotent
 def redeem():
     data = request.json
     reward_id = data.get('reward_id')
     user_id = data.get('user_id')
 
-    user = User.query.get(user_id)
-    reward = Reward.query.get(reward_id)
-
-    if not user or not reward:
+    reward = db.session.execute(
+        select(Reward.id, Reward.name, Reward.points_required).where(Reward.id == reward_id)
+    ).first()
+    if not reward:
         return jsonify({"message": "User or Reward not found"}), 404
 
-    if user.points < reward.points_required:
+    # Charge the points and take the stock with conditional in-database
+    # decrements (points >= cost, stock > 0) instead of read-modify-write, so
+    # concurrent redeemers across workers can neither oversell the reward nor
+    # overdraw a balance. The hot stock row is taken last to hold its lock
+    # for as short a time as possible; either failing rolls both back.
+    charged = debit_points(user_id, reward.points_required)
+    if not charged:
+        db.session.rollback()
+        if not db.session.execute(select(User.id).where(User.id == user_id)).first():
+            return jsonify({"message": "User or Reward not found"}), 404
         return jsonify({"message": "Insufficient points"}), 400
 
-    if reward.stock <= 0:
+    if not take_stock(reward.id):
+        db.session.rollback()
         return jsonify({"message": "Reward out of stock"}), 400
 
-    # Deduct points and stock
-    user.points -= reward.points_required
-    reward.stock -= 1
+    new_balance, user_name = charged
 
     # Record Redemption Request
     request_obj = RedemptionRequest(
-        user_id=user.id,
+        user_id=user_id,
         reward_id=reward.id,
         status='pending'
     )
 
     # Record transaction
     transaction = Transaction(
-        user_id=user.id,
+        user_id=user_id,
         amount=-reward.points_required,
         type='spend',
         description=f"Redeemed reward: {reward.name}"
@@ -56,29 +73,29 @@ def redeem():
 
     db.session.add(request_obj)
     db.session.add(transaction)
-    
-    # Create Admin Notification
-    from models import Notification
-    admin_alert = Notification(
-        title="New Redemption Request",
-        message=f"Customer {user.name} has requested: {reward.name} ({reward.points_required} pts).",
-        is_admin_alert=True
-    )
-    db.session.add(admin_alert)
-    
+    alert_message = f"Customer {user_name} has requested: {reward.name} ({reward.points_required} pts)."
     db.session.commit()
+    dashboard_stats.invalidate()
+    
+    # Admin Notification (written in the background)
+    notification_writer.enqueue(title="New Redemption Request", message=alert_message)
 
-    return jsonify({"message": "Redemption request submitted", "new_balance": user.points}), 200
+    return jsonify({"message": "Redemption request submitted", "new_balance": new_balance}), 200
 
 @rewards_bp.route('/redemption-history', methods=['GET'])
 @rewards_bp.route('/history', methods=['GET'])
+@query_budget(2)
 def redemption_history():
     user_id = request.args.get('user_id')
-    redemptions = RedemptionRequest.query.filter_by(user_id=user_id).order_by(RedemptionRequest.created_at.desc()).all()
+    query = (db.session.query(RedemptionRequest.id, RedemptionRequest.status, RedemptionRequest.created_at,
+                              Reward.name.label('reward_name'))
+             .outerjoin(Reward, Reward.id == RedemptionRequest.reward_id)
+             .filter(RedemptionRequest.user_id == user_id))
+    page = api_page(query, RedemptionRequest)
     
     return jsonify([{
         "id": r.id,
-        "reward_name": r.reward.name,
+        "reward_name": r.reward_name,
         "status": r.status,
         "date": r.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    } for r in redemptions]), 200
+    } for r in page]), 200, cursor_headers(page)
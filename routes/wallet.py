@@ -1,9 +1,19 @@
-from flask import Blueprint, request, jsonify
-from models import db, User, QRCode, Transaction
+from flask import Blueprint, request, jsonify, current_app
+from models import db, User, Transaction
 from datetime import datetime
+from services.scans import claim_code, claim_codes, credit_points, code_exists, existing_codes, bump_batch_counters
+from services.qr_bloom import qr_filter
+from services.notifications import notification_writer
+from services.dashboard import dashboard_stats
+from services.query_stats import query_budget
+from services.pagination import api_page, cursor_headers
+from services.idempotency import idempotent
 
 wallet_bp = Blueprint('wallet', __name__)
 
+# Largest carton the bulk scan endpoint accepts in one request
+MAX_BULK_CODES = 100
+
 @wallet_bp.route('/balance', methods=['GET'])
 def balance():
     user_id = request.args.get('user_id')
@@ -13,70 +23,155 @@ def balance():
     return jsonify({"points": user.points}), 200
 
 @wallet_bp.route('/scan', methods=['POST'])
+@idempotent
 def scan():
     data = request.json
-    print(f"DEBUG SCAN: Received data: {data}") # Debugging
+    current_app.logger.debug("Scan request: %s", data)
     
     uuid_code = data.get('uuid')
     user_id = data.get('user_id')
 
     if not uuid_code or not user_id:
-        print("DEBUG SCAN: Missing uuid or user_id")
+        current_app.logger.debug("Scan rejected: missing uuid or user_id")
         return jsonify({"message": "Missing uuid or user_id"}), 400
+    # Codes are strings; anything else simply won't match an issued one
+    uuid_code = str(uuid_code)
 
-    user = User.query.get(user_id)
-    if not user:
-        print(f"DEBUG SCAN: User {user_id} not found")
-        return jsonify({"message": "User not found"}), 404
-
-    qr_code = QRCode.query.filter_by(uuid=uuid_code).first()
+    # Codes that were never issued are rejected without touching the database
+    if not qr_filter.might_contain(uuid_code):
+        current_app.logger.debug("Scan rejected: invalid QR code %s", uuid_code)
+        return jsonify({"message": "Invalid QR Code"}), 400
 
-    if not qr_code:
-        print(f"DEBUG SCAN: Invalid QR Code {uuid_code}")
+    # Claim the code first with a conditional UPDATE so concurrent scans of
+    # the same code (across gunicorn workers) can never both credit points
+    claimed = claim_code(uuid_code, user_id, datetime.utcnow())
+    if not claimed:
+        db.session.rollback()
+        if code_exists(uuid_code):
+            current_app.logger.debug("Scan rejected: QR %s already redeemed", uuid_code)
+            return jsonify({"message": "QR Code already redeemed"}), 400
+        current_app.logger.debug("Scan rejected: invalid QR code %s", uuid_code)
         return jsonify({"message": "Invalid QR Code"}), 400
 
-    if qr_code.is_redeemed:
-        print(f"DEBUG SCAN: QR {uuid_code} already redeemed")
-        return jsonify({"message": "QR Code already redeemed"}), 400
+    points, batch_id = claimed
+    credited = credit_points(user_id, points)
+    if not credited:
+        # Unknown user: release the claim
+        db.session.rollback()
+        current_app.logger.debug("Scan rejected: user %s not found", user_id)
+        return jsonify({"message": "User not found"}), 404
 
-    # Redeem and add points
-    qr_code.is_redeemed = True
-    qr_code.redeemed_by = user.id
-    qr_code.redeemed_at = datetime.utcnow()
-    
-    user.points += qr_code.points
+    new_balance, user_name = credited
+    name_of_batch = bump_batch_counters(batch_id, 1, points)
 
     # Record transaction
     transaction = Transaction(
-        user_id=user.id,
-        amount=qr_code.points,
+        user_id=user_id,
+        amount=points,
         type='earn',
-        description=f"Points earned from QR scan (Batch: {qr_code.batch.batch_name})"
+        description=f"Points earned from QR scan (Batch: {name_of_batch})"
     )
     
     db.session.add(transaction)
+    db.session.commit()
+    dashboard_stats.invalidate()
     
-    # Create Admin Notification
-    from models import Notification
-    admin_alert = Notification(
+    # Admin Notification (written in the background)
+    notification_writer.enqueue(
         title="QR Scanned",
-        message=f"Customer {user.name} scanned a QR for {qr_code.points} points (Batch: {qr_code.batch.batch_name}).",
-        is_admin_alert=True
+        message=f"Customer {user_name} scanned a QR for {points} points (Batch: {name_of_batch})."
     )
-    db.session.add(admin_alert)
-    
+
+    return jsonify({
+        "message": "Scan successful",
+        "points_earned": points,
+        "new_balance": new_balance
+    }), 200
+
+@wallet_bp.route('/scan/bulk', methods=['POST'])
+@idempotent
+def scan_bulk():
+    data = request.json or {}
+    user_id = data.get('user_id')
+    codes = data.get('uuids')
+
+    if not user_id or not isinstance(codes, list) or not codes:
+        return jsonify({"message": "Missing uuids or user_id"}), 400
+
+    # Keep scan order, drop duplicates (the same bottle scanned twice)
+    codes = list(dict.fromkeys(str(c) for c in codes if c))
+    if len(codes) > MAX_BULK_CODES:
+        return jsonify({"message": f"At most {MAX_BULK_CODES} codes per request"}), 400
+
+    candidates = [c for c in codes if qr_filter.might_contain(c)]
+    claimed = claim_codes(candidates, user_id, datetime.utcnow()) if candidates else []
+
+    total_points = sum(points for _, points, _ in claimed)
+    new_balance = None
+    if claimed:
+        credited = credit_points(user_id, total_points)
+        if not credited:
+            # Unknown user: release every claim
+            db.session.rollback()
+            return jsonify({"message": "User not found"}), 404
+        new_balance, user_name = credited
+
+    won = {code: points for code, points, _ in claimed}
+    known = existing_codes([c for c in candidates if c not in won])
+    results = []
+    for code in codes:
+        if code in won:
+            results.append({"uuid": code, "status": "redeemed", "points": won[code]})
+        elif code in known:
+            results.append({"uuid": code, "status": "already_redeemed", "points": 0})
+        else:
+            results.append({"uuid": code, "status": "invalid", "points": 0})
+
+    if not claimed:
+        db.session.rollback()
+        return jsonify({"message": "No valid QR Codes", "redeemed": 0, "results": results}), 400
+
+    per_batch = {}
+    for _, points, batch_id in claimed:
+        count, batch_points = per_batch.get(batch_id, (0, 0))
+        per_batch[batch_id] = (count + 1, batch_points + points)
+    names = [bump_batch_counters(batch_id, count, batch_points)
+             for batch_id, (count, batch_points) in sorted(per_batch.items())]
+    batch_label = ", ".join(sorted(set(names)))
+
+    # One aggregated transaction and admin alert for the whole carton
+    transaction = Transaction(
+        user_id=user_id,
+        amount=total_points,
+        type='earn',
+        description=f"Points earned from bulk QR scan ({len(claimed)} codes, Batch: {batch_label})"
+    )
+    db.session.add(transaction)
     db.session.commit()
+    dashboard_stats.invalidate()
+
+    notification_writer.enqueue(
+        title="QR Scanned",
+        message=f"Customer {user_name} scanned {len(claimed)} QRs for {total_points} points (Batch: {batch_label})."
+    )
 
     return jsonify({
         "message": "Scan successful",
-        "points_earned": qr_code.points,
-        "new_balance": user.points
+        "redeemed": len(claimed),
+        "points_earned": total_points,
+        "new_balance": new_balance,
+        "results": results
     }), 200
 
 @wallet_bp.route('/transactions', methods=['GET'])
+@query_budget(2)
 def transactions():
     user_id = request.args.get('user_id')
-    txs = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.created_at.desc()).all()
+    # One page per call (?limit=&before=), a range scan on the
+    # (user_id, created_at, id) index; plain rows, no ORM objects
+    query = db.session.query(Transaction.id, Transaction.amount, Transaction.type,
+                             Transaction.description, Transaction.created_at).filter(Transaction.user_id == user_id)
+    page = api_page(query, Transaction)
     
     return jsonify([{
         "id": tx.id,
@@ -84,4 +179,4 @@ def transactions():
         "type": tx.type,
         "description": tx.description,
         "date": tx.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    } for tx in txs]), 200
+    } for tx in page]), 200, cursor_headers(page)
@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import select, func, literal_column
+from models import db, QRCode, User
+
+# Per-batch redemption analytics, computed with grouped SQL over qr_codes
+# (joined to users for geography) so no QRCode rows are loaded into Python.
+# Results are cached per batch and keyed on the batch's maintained
+# redeemed_count, so a scan in the batch makes the next read recompute while
+# idle batches are served from memory.
+
+GRANULARITIES = ('hour', 'day')
+TOP_LOCATIONS = 10
+CACHE_ENTRIES = 256
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def bucket_expr(column, granularity):
+    # Start of the hour/day as text, in each dialect's native date function
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        fmt = 'YYYY-MM-DD HH24:00' if granularity == 'hour' else 'YYYY-MM-DD'
+        return func.to_char(func.date_trunc(granularity, column), fmt)
+    if dialect in ('mysql', 'mariadb'):
+        fmt = '%Y-%m-%d %H:00' if granularity == 'hour' else '%Y-%m-%d'
+        return func.date_format(column, fmt)
+    fmt = '%Y-%m-%d %H:00' if granularity == 'hour' else '%Y-%m-%d'
+    return func.strftime(fmt, column)
+
+
+def _redeemed(batch_id):
+    return (QRCode.batch_id == batch_id, QRCode.is_redeemed == True)
+
+
+def _timeline(batch, granularity):
+    # Grouped per bucket, then running totals with a window over the groups
+    # (window ORDER BY cannot reference an output alias on Postgres)
+    grouped = (
+        select(
+            bucket_expr(QRCode.redeemed_at, granularity).label('bucket'),
+            func.count(QRCode.id).label('redemptions'),
+            func.coalesce(func.sum(QRCode.points), 0).label('points'),
+        )
+        .where(*_redeemed(batch.id))
+        .group_by(literal_column('bucket'))
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(
+            grouped.c.bucket,
+            grouped.c.redemptions,
+            grouped.c.points,
+            func.sum(grouped.c.redemptions).over(order_by=grouped.c.bucket).label('cumulative'),
+            func.sum(grouped.c.points).over(order_by=grouped.c.bucket).label('cumulative_points'),
+        ).order_by(grouped.c.bucket)
+    )
+    total = batch.total_qrs or 0
+    return [{
+        'bucket': row.bucket,
+        'redemptions': row.redemptions,
+        'points': row.points,
+        'cumulative': row.cumulative,
+        'cumulative_points': row.cumulative_points,
+        # Share of the batch redeemed by the end of this bucket
+        'redemption_rate': round(row.cumulative / total, 4) if total else 0.0,
+    } for row in rows]
+
+
+def _top_locations(batch_id, column):
+    rows = db.session.execute(
+        select(
+            column.label('name'),
+            func.count(QRCode.id).label('redemptions'),
+            func.coalesce(func.sum(QRCode.points), 0).label('points'),
+            func.count(func.distinct(QRCode.redeemed_by)).label('redeemers'),
+        )
+        .join(User, User.id == QRCode.redeemed_by)
+        .where(*_redeemed(batch_id))
+        .group_by(column)
+        .order_by(func.count(QRCode.id).desc())
+        .limit(TOP_LOCATIONS)
+    )
+    return [{'name': row.name or 'Unknown', 'redemptions': row.redemptions,
+             'points': row.points, 'redeemers': row.redeemers} for row in rows]
+
+
+def _summary(batch_id):
+    row = db.session.execute(
+        select(
+            func.count(func.distinct(QRCode.redeemed_by)).label('redeemers'),
+            func.min(QRCode.redeemed_at).label('first_scan'),
+            func.max(QRCode.redeemed_at).label('last_scan'),
+        ).where(*_redeemed(batch_id))
+    ).one()
+    return {
+        'redeemers': row.redeemers,
+        'first_scan': row.first_scan.strftime('%Y-%m-%d %H:%M') if row.first_scan else None,
+        'last_scan': row.last_scan.strftime('%Y-%m-%d %H:%M') if row.last_scan else None,
+    }
+
+
+def compute(batch, granularity='day'):
+    total = batch.total_qrs or 0
+    return {
+        'batch_id': batch.id,
+        'batch_name': batch.batch_name,
+        'granularity': granularity,
+        'total_qrs': total,
+        'total_points': batch.total_points,
+        'redeemed': batch.redeemed_count,
+        'redeemed_points': batch.redeemed_points,
+        'redemption_rate': round(batch.redeemed_count / total, 4) if total else 0.0,
+        **_summary(batch.id),
+        'timeline': _timeline(batch, granularity),
+        'top_cities': _top_locations(batch.id, User.city),
+        'top_states': _top_locations(batch.id, User.state),
+    }
+
+
+def batch_analytics(batch, granularity='day'):
+    if granularity not in GRANULARITIES:
+        granularity = 'day'
+    # created_at guards against a deleted batch's id being reused
+    key = (batch.id, batch.created_at, granularity)
+    with _lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == batch.redeemed_count:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    result = compute(batch, granularity)
+    with _lock:
+        _cache[key] = (batch.redeemed_count, result)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,97 @@
+from flask import g
+from sqlalchemy import select, func, update
+from sqlalchemy.exc import IntegrityError
+from models import db, QRBatch, QRCode, Counter, Notification, SupportMessage, WebsiteContact
+
+UNREAD_ADMIN_ALERTS = 'unread_admin_alerts'
+UNREAD_WEBSITE_CONTACTS = 'unread_website_contacts'
+UNREAD_SUPPORT_MESSAGES = 'unread_support_messages'
+
+
+def _unread_sources():
+    return {
+        UNREAD_ADMIN_ALERTS: select(func.count(Notification.id)).where(
+            Notification.is_admin_alert == True, Notification.is_read == False),
+        UNREAD_WEBSITE_CONTACTS: select(func.count(WebsiteContact.id)).where(
+            WebsiteContact.is_read == False),
+        UNREAD_SUPPORT_MESSAGES: select(func.count(SupportMessage.id)).where(
+            SupportMessage.is_read == False),
+    }
+
+
+def recompute_batch_counters():
+    # Rebuild QRBatch.redeemed_count/redeemed_points from qr_codes in one UPDATE
+    redeemed = (QRCode.batch_id == QRBatch.id) & (QRCode.is_redeemed == True)
+    count_q = select(func.count(QRCode.id)).where(redeemed).scalar_subquery()
+    points_q = select(func.coalesce(func.sum(QRCode.points), 0)).where(redeemed).scalar_subquery()
+    result = db.session.execute(
+        update(QRBatch)
+        .values(redeemed_count=count_q, redeemed_points=points_q)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def seed_unread_counters():
+    # Creates missing counter rows from a one-off count, so adjust_counter()
+    # only ever needs an UPDATE. Called at startup; safe with several workers.
+    existing = set(db.session.execute(select(Counter.name)).scalars())
+    for name, source in _unread_sources().items():
+        if name in existing:
+            continue
+        try:
+            db.session.add(Counter(name=name, value=db.session.execute(source).scalar()))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker seeded it first
+            db.session.rollback()
+
+
+def recompute_unread_counters():
+    for name, source in _unread_sources().items():
+        db.session.execute(
+            update(Counter).where(Counter.name == name)
+            .values(value=source.scalar_subquery())
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def adjust_counter(name, delta):
+    # Runs inside the caller's transaction so the counter commits with the change
+    if delta:
+        db.session.execute(
+            update(Counter).where(Counter.name == name)
+            .values(value=Counter.value + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def unread_counts():
+    # Every unread badge in one primary-key lookup, at most once per request
+    if 'unread_counts' not in g:
+        counts = dict.fromkeys((UNREAD_ADMIN_ALERTS, UNREAD_WEBSITE_CONTACTS, UNREAD_SUPPORT_MESSAGES), 0)
+        counts.update(db.session.execute(
+            select(Counter.name, Counter.value).where(Counter.name.in_(list(counts)))
+        ).all())
+        g.unread_counts = counts
+    return g.unread_counts
+
+
+
+def mark_notification_read(notification_id):
+    # Conditional flip, so a double click or two admins never decrement twice.
+    # Returns True if this call changed the row; the caller commits.
+    is_admin_alert = db.session.execute(
+        select(Notification.is_admin_alert).where(Notification.id == notification_id)
+    ).scalar()
+    flipped = db.session.execute(
+        update(Notification)
+        .where(Notification.id == notification_id, Notification.is_read == False)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if flipped and is_admin_alert:
+        adjust_counter(UNREAD_ADMIN_ALERTS, -1)
+    return bool(flipped)
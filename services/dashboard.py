@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import select, func
+from models import db, User, Product, Reward, QRBatch, QRCode, RedemptionRequest, Order, SupportMessage, WebsiteContact
+from services import shared_state
+from services.rollups import rollups
+
+MARKER = 'dashboard_stats'
+ACTIVITY_DAYS = 14
+# Statements _compute() runs on a cold cache; views that call get() add this
+# to their query budget
+COLD_QUERIES = 5
+
+logger = logging.getLogger(__name__)
+
+
+def _count(model, *criteria):
+    return select(func.count(model.id)).where(*criteria).scalar_subquery()
+
+
+class DashboardStats:
+    # Cached snapshot of the dashboard counters. All counters come back from a
+    # single SELECT of scalar subqueries; the snapshot lives for ttl seconds or
+    # until a write anywhere (any worker) calls invalidate().
+
+    def __init__(self):
+        self.ttl = 15
+        self._snapshot = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('DASHBOARD_CACHE_SECONDS', 15)
+
+    def invalidate(self):
+        self._snapshot = None
+        # Called after the write has committed; a marker failure only delays
+        # other workers until their ttl expires, it must not fail the request
+        try:
+            shared_state.bump(MARKER)
+        except OSError:
+            logger.exception("Could not bump the %s marker", MARKER)
+
+    def get(self):
+        version = shared_state.version(MARKER)
+        with self._lock:
+            snap = self._snapshot
+            if snap is None or self._version != version or time.monotonic() - snap.computed_mono > self.ttl:
+                snap = self._compute()
+                self._snapshot = snap
+                self._version = version
+        snap.age_seconds = int(time.monotonic() - snap.computed_mono)
+        return snap
+
+    def _compute(self):
+        counters = db.session.execute(select(
+            _count(User).label('user_count'),
+            _count(Product).label('product_count'),
+            _count(Reward).label('reward_count'),
+            _count(QRBatch).label('batch_count'),
+            _count(RedemptionRequest, RedemptionRequest.status == 'pending').label('pending_redemptions'),
+            _count(Order, Order.status == 'pending').label('pending_orders'),
+            _count(SupportMessage, SupportMessage.is_read == False).label('unread_messages'),
+            _count(WebsiteContact, WebsiteContact.is_read == False).label('unread_website_contacts'),
+        )).one()._asdict()
+
+        # Recent activity is cached as plain rows so nothing ORM-bound outlives the request
+        recent_scans = [
+            SimpleNamespace(redeemed_by=r.redeemed_by, points=r.points, redeemed_at=r.redeemed_at)
+            for r in db.session.execute(
+                select(QRCode.redeemed_by, QRCode.points, QRCode.redeemed_at)
+                .where(QRCode.is_redeemed == True)
+                .order_by(QRCode.redeemed_at.desc())
+                .limit(5)
+            )
+        ]
+        recent_redemptions = [
+            SimpleNamespace(status=r.status,
+                            user=SimpleNamespace(name=r.user_name),
+                            reward=SimpleNamespace(name=r.reward_name))
+            for r in db.session.execute(
+                select(RedemptionRequest.status, User.name.label('user_name'), Reward.name.label('reward_name'))
+                .join(User, RedemptionRequest.user_id == User.id)
+                .join(Reward, RedemptionRequest.reward_id == Reward.id)
+                .order_by(RedemptionRequest.created_at.desc())
+                .limit(5)
+            )
+        ]
+
+        # Trend and coverage come from the daily rollups, not the source tables
+        rollups.ensure_refreshing()
+        activity = rollups.daily_activity(days=ACTIVITY_DAYS)
+        top_states = rollups.top_states(days=30)
+
+        return SimpleNamespace(
+            activity=activity,
+            top_states=top_states,
+            recent_scans=recent_scans,
+            recent_redemptions=recent_redemptions,
+            computed_at=datetime.utcnow(),
+            computed_mono=time.monotonic(),
+            age_seconds=0,
+            **counters
+        )
+
+
+dashboard_stats = DashboardStats()
@@ -0,0 +1,248 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, date, timedelta
+from xml.sax.saxutils import escape
+from sqlalchemy import select
+from models import db, User, Transaction, RedemptionRequest, Reward, QRCode, QRBatch
+from services.qr_export import StreamBuffer, FETCH_SIZE
+
+# Spreadsheet exports for the admin panel. Rows come off a server-side cursor
+# (yield_per) and are encoded as they arrive, so memory stays flat whatever
+# the row count. XLSX is written as a minimal workbook whose sheet XML is
+# streamed through ZipFile.open(..., 'w') into the unseekable StreamBuffer.
+
+FORMATS = ('csv', 'xlsx')
+# Rows encoded between two writes to the response
+FLUSH_ROWS = 500
+# A leading +/- followed only by digits and phone punctuation is a number or
+# phone (+91 98765 43210, -250), not a formula
+_PLAIN_NUMBER = re.compile(r'[+-][\d\s().-]*')
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_day(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ExportError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def _date_range(column, start, end):
+    criteria = []
+    if start:
+        criteria.append(column >= start)
+    if end:
+        # end is inclusive of the whole day
+        criteria.append(column < end + timedelta(days=1))
+    return criteria
+
+
+def _scanned_batch(user_id_column, batch_id):
+    # Users who redeemed at least one code from the batch
+    if not batch_id:
+        return []
+    return [select(QRCode.id).where(QRCode.batch_id == batch_id,
+                                    QRCode.redeemed_by == user_id_column).exists()]
+
+
+def _stream(stmt):
+    return db.session.execute(stmt.execution_options(yield_per=FETCH_SIZE))
+
+
+def users_export(start=None, end=None, batch_id=None, **_):
+    header = ['ID', 'Name', 'Phone', 'Email', 'City', 'State', 'Points', 'Joined']
+    stmt = (
+        select(User.id, User.name, User.phone, User.email, User.city, User.state, User.points, User.created_at)
+        .where(*_date_range(User.created_at, start, end), *_scanned_batch(User.id, batch_id))
+        .order_by(User.id)
+    )
+    return header, _stream(stmt)
+
+
+def transactions_export(start=None, end=None, **_):
+    header = ['ID', 'Date', 'User ID', 'Customer', 'Phone', 'Type', 'Amount', 'Description']
+    stmt = (
+        select(Transaction.id, Transaction.created_at, Transaction.user_id, User.name, User.phone,
+               Transaction.type, Transaction.amount, Transaction.description)
+        .outerjoin(User, User.id == Transaction.user_id)
+        .where(*_date_range(Transaction.created_at, start, end))
+        .order_by(Transaction.id)
+    )
+    return header, _stream(stmt)
+
+
+def redemptions_export(start=None, end=None, status=None, batch_id=None, **_):
+    header = ['ID', 'Date', 'Status', 'User ID', 'Customer', 'Phone', 'City', 'State', 'Reward', 'Points']
+    criteria = _date_range(RedemptionRequest.created_at, start, end)
+    if status:
+        criteria.append(RedemptionRequest.status == status)
+    criteria += _scanned_batch(RedemptionRequest.user_id, batch_id)
+    stmt = (
+        select(RedemptionRequest.id, RedemptionRequest.created_at, RedemptionRequest.status,
+               RedemptionRequest.user_id, User.name, User.phone, User.city, User.state,
+               Reward.name, Reward.points_required)
+        .outerjoin(User, User.id == RedemptionRequest.user_id)
+        .outerjoin(Reward, Reward.id == RedemptionRequest.reward_id)
+        .where(*criteria)
+        .order_by(RedemptionRequest.id)
+    )
+    return header, _stream(stmt)
+
+
+def batch_codes_export(batch_id=None, start=None, end=None, **_):
+    # start/end filter on redemption time; without them every code is listed
+    if not batch_id:
+        raise ExportError("batch_id is required")
+    header = ['Code ID', 'Batch', 'UUID', 'Points', 'Redeemed', 'Redeemed By', 'Redeemed At']
+    stmt = (
+        select(QRCode.id, QRBatch.batch_name, QRCode.uuid, QRCode.points, QRCode.is_redeemed,
+               QRCode.redeemed_by, QRCode.redeemed_at)
+        .join(QRBatch, QRBatch.id == QRCode.batch_id)
+        .where(QRCode.batch_id == batch_id, *_date_range(QRCode.redeemed_at, start, end))
+        .order_by(QRCode.id)
+    )
+    return header, _stream(stmt)
+
+
+DATASETS = {
+    'users': users_export,
+    'transactions': transactions_export,
+    'redemptions': redemptions_export,
+    'batch-codes': batch_codes_export,
+}
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value.isoformat()
+    return value
+
+
+def _csv_safe(value):
+    # Keep spreadsheet apps from evaluating user-entered text as a formula.
+    # Only CSV needs this: xlsx cells are written as inline strings.
+    if not isinstance(value, str) or not value:
+        return value
+    first = value[0]
+    if first in ('=', '@', '\t', '\r') or (first in ('+', '-') and not _PLAIN_NUMBER.fullmatch(value)):
+        return "'" + value
+    return value
+
+
+def stream_csv(header, rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    # BOM so Excel opens UTF-8 names correctly
+    out.write('\ufeff')
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_csv_safe(_cell(v)) for v in row])
+        if i % FLUSH_ROWS == 0:
+            yield out.getvalue().encode('utf-8')
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue().encode('utf-8')
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _workbook(sheet_name):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        value = _cell(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+    return '<row>' + ''.join(cells) + '</row>'
+
+
+def stream_xlsx(header, rows, sheet_name='Export'):
+    buf = StreamBuffer()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _ROOT_RELS)
+        zf.writestr('xl/workbook.xml', _workbook(sheet_name))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield buf.drain()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(header).encode('utf-8'))
+            pending = []
+            for i, row in enumerate(rows, 1):
+                pending.append(_xlsx_row(row))
+                if i % FLUSH_ROWS == 0:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    yield buf.drain()
+            sheet.write(''.join(pending).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+    yield buf.drain()
+
+
+def export(dataset, fmt, **filters):
+    # Returns (chunk iterator, mimetype, filename); raises ExportError on bad input
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown export '{dataset}'")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format '{fmt}'")
+    header, rows = DATASETS[dataset](**filters)
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M')
+    suffix = f"_batch{filters['batch_id']}" if filters.get('batch_id') else ''
+    filename = f"{dataset}{suffix}_{stamp}.{fmt}"
+    if fmt == 'csv':
+        return stream_csv(header, rows), 'text/csv; charset=utf-8', filename
+    return (stream_xlsx(header, rows, sheet_name=dataset),
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', filename)
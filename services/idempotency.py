@@ -0,0 +1,138 @@
+import functools
+import hashlib
+import time
+from datetime import datetime, timedelta
+from flask import current_app, jsonify, make_response, request, Response
+from sqlalchemy import select, update, delete, insert
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+
+# Idempotency-Key support for retried mobile requests. The first request with
+# a key reserves it (a primary-key INSERT, so concurrent retries race on the
+# constraint rather than on the business logic), runs the view and stores its
+# response. Later requests with the same key get that response back from one
+# primary-key lookup without re-running the view, or 409 while the first one
+# is still in flight. 5xx responses and exceptions release the key so the
+# client can retry for real. Reusing a key with a different body is a 422.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Expired rows are deleted at most this often per worker
+PURGE_INTERVAL = 300
+
+_last_purge = 0.0
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _ttl():
+    return timedelta(seconds=current_app.config.get('IDEMPOTENCY_TTL_SECONDS', 86400))
+
+
+def _lookup(key_hash):
+    return db.session.execute(
+        select(IdempotencyKey.fingerprint, IdempotencyKey.status_code,
+               IdempotencyKey.body, IdempotencyKey.created_at)
+        .where(IdempotencyKey.key_hash == key_hash)
+    ).first()
+
+
+def _replay(row, fingerprint):
+    if row.fingerprint != fingerprint:
+        return jsonify({"message": f"{HEADER} was already used for a different request"}), 422
+    if row.status_code is None:
+        response = jsonify({"message": "A request with this Idempotency-Key is still being processed"})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    response = Response(row.body, status=row.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _reserve(key_hash, fingerprint):
+    # None when this request now owns the key, otherwise the response to send
+    now = datetime.utcnow()
+    row = _lookup(key_hash)
+    if row is not None:
+        lock = timedelta(seconds=current_app.config.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+        expired = row.created_at < now - _ttl()
+        abandoned = row.status_code is None and row.created_at < now - lock
+        if not (expired or abandoned):
+            return _replay(row, fingerprint)
+        # Take the stale row over; the created_at match lets only one retry win
+        taken = db.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key_hash == key_hash, IdempotencyKey.created_at == row.created_at)
+            .values(fingerprint=fingerprint, status_code=None, body=None, created_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return None if taken == 1 else _replay(_lookup(key_hash), fingerprint)
+
+    try:
+        db.session.execute(insert(IdempotencyKey).values(
+            key_hash=key_hash, fingerprint=fingerprint, created_at=now))
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent retry reserved it first
+        db.session.rollback()
+        return _replay(_lookup(key_hash), fingerprint)
+    _purge_expired()
+    return None
+
+
+def _store(key_hash, response):
+    db.session.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key_hash == key_hash)
+        .values(status_code=response.status_code, body=response.get_data(as_text=True))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _release(key_hash):
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash))
+    db.session.commit()
+
+
+def _purge_expired():
+    global _last_purge
+    if time.monotonic() - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = time.monotonic()
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - _ttl()))
+    db.session.commit()
+
+
+def idempotent(view):
+    # Honour an Idempotency-Key header on a JSON POST view; without the
+    # header the view runs as before
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"message": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+        key_hash = _digest(f"{request.endpoint}\n{key}".encode())
+        stored = _reserve(key_hash, _digest(request.get_data()))
+        if stored is not None:
+            return stored
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            _release(key_hash)
+            raise
+        if response.status_code >= 500:
+            _release(key_hash)
+        else:
+            _store(key_hash, response)
+        return response
+    return wrapper
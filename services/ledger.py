@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func, update, delete, insert, and_, literal, Integer, DateTime
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Transaction, Counter, BalanceSnapshot, LedgerDrift, ReconciliationRun
+
+# Ledger reconciliation. balance_snapshots holds each user's balance summed
+# from transactions up to a watermark (a transaction id kept in counters).
+# A run folds only the transactions past the watermark into the snapshots,
+# in id-range chunks that each advance the watermark with a conditional
+# UPDATE and commit with it, so no run rescans the whole ledger and two
+# concurrent runs never fold the same rows. Drift is then found with one
+# statement comparing users.points to snapshot + transactions still past the
+# watermark; the result is kept in ledger_drift and summarised per run.
+
+WATERMARK = 'ledger_watermark'
+REFUND = 'refund'
+# Transaction types that make up "points spent" (refunds are positive)
+SPEND_TYPES = ('spend', REFUND)
+CHUNK_TRANSACTIONS = 50000
+
+
+def _watermark():
+    value = db.session.execute(select(Counter.value).where(Counter.name == WATERMARK)).scalar()
+    if value is not None:
+        return value
+    try:
+        db.session.add(Counter(name=WATERMARK, value=0))
+        db.session.commit()
+    except IntegrityError:
+        # Another run created it first
+        db.session.rollback()
+    return db.session.execute(select(Counter.value).where(Counter.name == WATERMARK)).scalar()
+
+
+def _settled_until(start, lag):
+    # Highest id old enough to have committed; a range scan on the primary key
+    return db.session.execute(
+        select(func.max(Transaction.id))
+        .where(Transaction.id > start, Transaction.created_at < datetime.utcnow() - lag)
+    ).scalar()
+
+
+def _fold(lower, upper):
+    # Adds transactions in (lower, upper] to the snapshots with two set-based
+    # statements; returns (transactions, users touched)
+    in_window = and_(Transaction.id > lower, Transaction.id <= upper)
+    now = datetime.utcnow()
+    delta = (select(func.coalesce(func.sum(Transaction.amount), 0))
+             .where(in_window, Transaction.user_id == BalanceSnapshot.user_id)
+             .scalar_subquery())
+    updated = db.session.execute(
+        update(BalanceSnapshot)
+        .where(BalanceSnapshot.user_id.in_(select(Transaction.user_id).where(in_window)))
+        .values(balance=BalanceSnapshot.balance + delta, through_transaction_id=upper, updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    # Users seen for the first time (run after the update so nobody is counted twice)
+    inserted = db.session.execute(
+        insert(BalanceSnapshot).from_select(
+            ['user_id', 'balance', 'through_transaction_id', 'updated_at'],
+            select(Transaction.user_id, func.sum(Transaction.amount),
+                   literal(upper, Integer), literal(now, DateTime))
+            .where(in_window, ~select(BalanceSnapshot.user_id)
+                   .where(BalanceSnapshot.user_id == Transaction.user_id).exists())
+            .group_by(Transaction.user_id)
+        )
+    ).rowcount
+    count = db.session.execute(select(func.count(Transaction.id)).where(in_window)).scalar()
+    return count, updated + inserted
+
+
+def advance(lag=None, chunk=CHUNK_TRANSACTIONS):
+    # Folds settled transactions past the watermark into the snapshots.
+    # Returns (from_id, to_id, transactions, users touched).
+    if lag is None:
+        lag = timedelta(seconds=current_app.config.get('LEDGER_LAG_SECONDS', 120))
+    start = _watermark()
+    end = _settled_until(start, lag)
+    position, transactions, users = start, 0, 0
+    while end is not None and position < end:
+        upper = min(position + chunk, end)
+        claimed = db.session.execute(
+            update(Counter)
+            .where(Counter.name == WATERMARK, Counter.value == position)
+            .values(value=upper)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed != 1:
+            # A concurrent run moved the watermark; it carries on from here
+            db.session.rollback()
+            break
+        count, touched = _fold(position, upper)
+        db.session.commit()
+        transactions += count
+        users += touched
+        position = upper
+    return start, position, transactions, users
+
+
+def find_drift():
+    # (user_id, stored points, ledger points) for every user whose points
+    # disagree with the ledger. One statement, so the watermark, snapshots and
+    # transactions past it are read consistently.
+    watermark = select(Counter.value).where(Counter.name == WATERMARK).scalar_subquery()
+    pending = (
+        select(Transaction.user_id.label('user_id'), func.sum(Transaction.amount).label('amount'))
+        .where(Transaction.id > func.coalesce(watermark, 0))
+        .group_by(Transaction.user_id)
+        .subquery()
+    )
+    stored = func.coalesce(User.points, 0)
+    ledger = func.coalesce(BalanceSnapshot.balance, 0) + func.coalesce(pending.c.amount, 0)
+    return db.session.execute(
+        select(User.id, stored, ledger)
+        .outerjoin(BalanceSnapshot, BalanceSnapshot.user_id == User.id)
+        .outerjoin(pending, pending.c.user_id == User.id)
+        .where(stored != ledger)
+    ).all()
+
+
+def _record_drift(rows):
+    now = datetime.utcnow()
+    existing = {d.user_id: d for d in LedgerDrift.query}
+    total = 0
+    for user_id, stored, ledger in rows:
+        total += abs(stored - ledger)
+        entry = existing.pop(user_id, None)
+        if entry is None:
+            db.session.add(LedgerDrift(user_id=user_id, stored_points=stored, ledger_points=ledger,
+                                       drift=stored - ledger, first_seen_at=now, last_seen_at=now))
+        else:
+            entry.stored_points, entry.ledger_points = stored, ledger
+            entry.drift, entry.last_seen_at = stored - ledger, now
+    # Whatever is left has been resolved since the last run
+    for entry in existing.values():
+        db.session.delete(entry)
+    return len(rows), total
+
+
+def reconcile(lag=None):
+    started = datetime.utcnow()
+    start, end, transactions, users = advance(lag)
+    drifted, total = _record_drift(find_drift())
+    run = ReconciliationRun(started_at=started, finished_at=datetime.utcnow(),
+                            from_transaction_id=start, to_transaction_id=end,
+                            transactions=transactions, users_updated=users,
+                            drifted_users=drifted, total_drift=total)
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def rebuild(lag=None):
+    # Drops every snapshot and folds the whole ledger again
+    _watermark()
+    db.session.execute(delete(BalanceSnapshot))
+    db.session.execute(delete(LedgerDrift))
+    db.session.execute(update(Counter).where(Counter.name == WATERMARK).values(value=0))
+    db.session.commit()
+    return reconcile(lag)
+
+
+def drop_user(user_id):
+    # Caller commits, alongside deleting the user's transactions
+    db.session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.user_id == user_id))
+    db.session.execute(delete(LedgerDrift).where(LedgerDrift.user_id == user_id))
+
+
+def report(limit=100):
+    run = ReconciliationRun.query.order_by(ReconciliationRun.id.desc()).first()
+    rows = db.session.execute(
+        select(LedgerDrift, User.name, User.phone)
+        .join(User, User.id == LedgerDrift.user_id)
+        .order_by(func.abs(LedgerDrift.drift).desc(), LedgerDrift.user_id)
+        .limit(limit)
+    ).all()
+    return {
+        "last_run": None if run is None else {
+            "id": run.id,
+            "started_at": run.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "finished_at": run.finished_at.strftime("%Y-%m-%d %H:%M:%S") if run.finished_at else None,
+            "from_transaction_id": run.from_transaction_id,
+            "to_transaction_id": run.to_transaction_id,
+            "transactions": run.transactions,
+            "users_updated": run.users_updated,
+            "drifted_users": run.drifted_users,
+            "total_drift": run.total_drift,
+        },
+        "drift": [{
+            "user_id": d.user_id,
+            "name": name,
+            "phone": phone,
+            "stored_points": d.stored_points,
+            "ledger_points": d.ledger_points,
+            "drift": d.drift,
+            "first_seen_at": d.first_seen_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "last_seen_at": d.last_seen_at.strftime("%Y-%m-%d %H:%M:%S"),
+        } for d, name, phone in rows],
+    }
@@ -0,0 +1,286 @@
+import glob
+import json
+import os
+import threading
+import time
+from flask import g, request
+
+try:
+    import fcntl
+except ImportError:  # Windows; the dev server is a single process there
+    fcntl = None
+
+# Prometheus-style request metrics. Each gunicorn worker keeps its own numbers
+# in memory and snapshots them to METRICS_DIR/worker_<pid>_*.json; /admin/metrics
+# merges every snapshot, so the output covers all workers. Snapshots of workers
+# that exited or were replaced are folded into METRICS_DIR/retired.json and
+# deleted, so counters stay monotonic while the directory holds one file per
+# live worker.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RETIRED = 'retired.json'
+RETIRE_LOCK = 'retired.lock'
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.metrics_dir = None
+        self.flush_interval = 1.0
+        self._lock = threading.Lock()
+        self._retire_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # Part of the snapshot name so a recycled pid never overwrites old totals
+        self._started = time.time_ns()
+        self._last_flush = 0.0
+        self.histograms = {} # "endpoint|method" -> {'buckets': [...], 'sum': s, 'count': n}
+        self.statuses = {}   # "endpoint|method|status" -> n
+        self.in_flight = {}  # "endpoint" -> n
+        self.db_queries = {} # "endpoint" -> {'queries': n, 'seconds': s}
+
+    def init_app(self, app):
+        self.metrics_dir = app.config['METRICS_DIR']
+        self.flush_interval = app.config.get('METRICS_FLUSH_SECONDS', 1.0)
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _check_fork(self):
+        # A forked worker must not report its parent's numbers as its own
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            self._check_fork()
+            key = g._metrics_endpoint
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def _after_request(self, response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        endpoint = g.pop('_metrics_endpoint')
+        status = g.pop('_metrics_status', 500 if exc else 200)
+        self.observe(endpoint, request.method, status, elapsed)
+
+    def observe(self, endpoint, method, status, elapsed):
+        with self._lock:
+            self._check_fork()
+            self.in_flight[endpoint] = max(0, self.in_flight.get(endpoint, 0) - 1)
+
+            hist = self.histograms.setdefault(f"{endpoint}|{method}", {
+                'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0,
+            })
+            for i, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += elapsed
+            hist['count'] += 1
+
+            key = f"{endpoint}|{method}|{status}"
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._last_flush = now
+                self._write_snapshot()
+
+    def observe_queries(self, endpoint, count, seconds):
+        # Per-request SQL totals reported by services/query_stats.py
+        with self._lock:
+            self._check_fork()
+            totals = self.db_queries.setdefault(endpoint, {'queries': 0, 'seconds': 0.0})
+            totals['queries'] += count
+            totals['seconds'] += seconds
+
+    def _snapshot_path(self):
+        return os.path.join(self.metrics_dir, f"worker_{self._pid}_{self._started}.json")
+
+    def _write_snapshot(self):
+        data = {
+            'pid': self._pid,
+            'started': self._started,
+            'histograms': self.histograms,
+            'statuses': self.statuses,
+            'in_flight': self.in_flight,
+            'db_queries': self.db_queries,
+        }
+        path = self._snapshot_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        with self._lock:
+            self._check_fork()
+            self._write_snapshot()
+
+    def _load_snapshots(self):
+        snapshots = {}
+        for path in glob.glob(os.path.join(self.metrics_dir, 'worker_*.json')):
+            try:
+                with open(path) as f:
+                    snapshots[os.path.basename(path)] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def _load_retired(self):
+        try:
+            with open(os.path.join(self.metrics_dir, RETIRED)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'histograms': {}, 'statuses': {}, 'db_queries': {}, 'folded': []}
+
+    def _write_retired(self, retired):
+        path = os.path.join(self.metrics_dir, RETIRED)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(retired, f)
+        os.replace(tmp_path, path)
+
+    def _collect(self):
+        # Returns (live worker snapshots, retired totals), first folding the
+        # snapshots of dead or replaced workers into retired.json. Locked so
+        # two workers rendering at once never fold the same file twice.
+        with self._retire_lock, open(os.path.join(self.metrics_dir, RETIRE_LOCK), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file closes
+            retired = self._load_retired()
+            snapshots = self._load_snapshots()
+            # Already counted, left behind by a crash before the delete
+            leftover = set(retired['folded']) & set(snapshots)
+            newest = {}
+            for name, snap in snapshots.items():
+                if name not in leftover:
+                    newest[snap['pid']] = max(newest.get(snap['pid'], 0), snap['started'])
+            live, dead = [], []
+            for name, snap in snapshots.items():
+                if name in leftover:
+                    continue
+                if snap['started'] == newest[snap['pid']] and _pid_alive(snap['pid']):
+                    live.append(snap)
+                else:
+                    _add_counters(retired, snap)
+                    dead.append(name)
+            if dead or set(retired['folded']) != leftover:
+                # Name the folded files before deleting them, so a crash in
+                # between cannot count them again
+                retired['folded'] = sorted(leftover.union(dead))
+                self._write_retired(retired)
+            for name in retired['folded']:
+                try:
+                    os.remove(os.path.join(self.metrics_dir, name))
+                except FileNotFoundError:
+                    pass
+        return live, retired
+
+    def render(self):
+        self.flush()
+        live, retired = self._collect()
+        totals = {'histograms': {}, 'statuses': {}, 'db_queries': {}}
+        _add_counters(totals, retired)
+        in_flight = {}
+        for snap in live:
+            _add_counters(totals, snap)
+            # Gauges come from live workers only
+            for key, value in snap['in_flight'].items():
+                in_flight[key] = in_flight.get(key, 0) + value
+        histograms, statuses, db_queries = totals['histograms'], totals['statuses'], totals['db_queries']
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by endpoint.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for key in sorted(histograms):
+            endpoint, method = key.split('|')
+            hist = histograms[key]
+            labels = _labels(endpoint=endpoint, blueprint=_blueprint(endpoint), method=method)
+            for bound, count in zip(BUCKETS, hist['buckets']):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {hist["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {hist["sum"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {hist["count"]}')
+
+        lines += [
+            '# HELP http_requests_total Responses by endpoint and status code.',
+            '# TYPE http_requests_total counter',
+        ]
+        for key in sorted(statuses):
+            endpoint, method, status = key.split('|')
+            labels = _labels(endpoint=endpoint, blueprint=_blueprint(endpoint), method=method, status=status)
+            lines.append(f'http_requests_total{{{labels}}} {statuses[key]}')
+
+        lines += [
+            '# HELP http_requests_in_flight Requests currently being served.',
+            '# TYPE http_requests_in_flight gauge',
+        ]
+        for endpoint in sorted(in_flight):
+            labels = _labels(endpoint=endpoint, blueprint=_blueprint(endpoint))
+            lines.append(f'http_requests_in_flight{{{labels}}} {in_flight[endpoint]}')
+
+        lines += [
+            '# HELP db_queries_total SQL statements executed by request handlers.',
+            '# TYPE db_queries_total counter',
+        ]
+        for endpoint in sorted(db_queries):
+            labels = _labels(endpoint=endpoint, blueprint=_blueprint(endpoint))
+            lines.append(f'db_queries_total{{{labels}}} {db_queries[endpoint]["queries"]}')
+        lines += [
+            '# HELP db_query_seconds_total Time spent in SQL statements by request handlers.',
+            '# TYPE db_query_seconds_total counter',
+        ]
+        for endpoint in sorted(db_queries):
+            labels = _labels(endpoint=endpoint, blueprint=_blueprint(endpoint))
+            lines.append(f'db_query_seconds_total{{{labels}}} {db_queries[endpoint]["seconds"]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _add_counters(totals, snap):
+    for key, hist in snap['histograms'].items():
+        merged = totals['histograms'].setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], hist['buckets'])]
+        merged['sum'] += hist['sum']
+        merged['count'] += hist['count']
+    for key, value in snap['statuses'].items():
+        totals['statuses'][key] = totals['statuses'].get(key, 0) + value
+    for key, queries in snap.get('db_queries', {}).items():
+        merged = totals['db_queries'].setdefault(key, {'queries': 0, 'seconds': 0.0})
+        merged['queries'] += queries['queries']
+        merged['seconds'] += queries['seconds']
+
+
+def _blueprint(endpoint):
+    return endpoint.split('.', 1)[0] if '.' in endpoint else ''
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels.items()
+    )
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,145 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from models import db, Notification
+from services.counters import adjust_counter, UNREAD_ADMIN_ALERTS
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class NotificationWriter:
+    # Write-behind queue for Notification rows. Request handlers enqueue after
+    # their own commit; a background thread batch-inserts every flush_ms or
+    # batch_size rows, so user-facing transactions carry only business rows.
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('NOTIFY_ASYNC', True)
+        self.flush_interval = app.config.get('NOTIFY_FLUSH_MS', 250) / 1000
+        self.batch_size = app.config.get('NOTIFY_BATCH_SIZE', 200)
+        self.queue_size = app.config.get('NOTIFY_QUEUE_SIZE', 10000)
+        # What to do when the queue is full:
+        #   sync  - write the row inline (never loses an alert)
+        #   block - wait up to NOTIFY_BLOCK_MS for space, then write inline
+        #   drop  - discard the alert and count it
+        self.overflow = app.config.get('NOTIFY_OVERFLOW', 'sync')
+        self.block_timeout = app.config.get('NOTIFY_BLOCK_MS', 50) / 1000
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        # Threads don't survive fork: start one per gunicorn worker on first use
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._run, name='notification-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def enqueue(self, title, message, user_id=None, is_admin_alert=True):
+        row = {
+            'user_id': user_id,
+            'title': title,
+            'message': message,
+            'is_read': False,
+            'is_admin_alert': is_admin_alert,
+            'created_at': datetime.utcnow(),
+        }
+        if not self.enabled:
+            self._write([row])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            return
+        except queue.Full:
+            pass
+
+        if self.overflow == 'drop':
+            self.dropped += 1
+            logger.warning("Notification queue full, dropped alert: %s", title)
+            return
+        if self.overflow == 'block':
+            try:
+                self._queue.put(row, timeout=self.block_timeout)
+                return
+            except queue.Full:
+                pass
+        self._write([row])
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            rows = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                rows.append(item)
+            self._write(rows)
+            if stop:
+                return
+
+    def _write(self, rows, attempts=3):
+        for attempt in range(attempts):
+            try:
+                with self.app.app_context():
+                    db.session.execute(Notification.__table__.insert(), rows)
+                    adjust_counter(UNREAD_ADMIN_ALERTS, sum(1 for row in rows if row['is_admin_alert']))
+                    db.session.commit()
+                return True
+            except Exception:
+                # Usually a transient SQLite write lock; back off and retry
+                logger.exception("Failed to write %d notifications (attempt %d)", len(rows), attempt + 1)
+                time.sleep(0.1 * (attempt + 1))
+        return False
+
+    def flush(self, timeout=5):
+        # Drain everything queued so far; used on shutdown
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def shutdown(self):
+        self.flush()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'capacity': getattr(self, 'queue_size', 0),
+            'dropped': self.dropped,
+        }
+
+
+notification_writer = NotificationWriter()
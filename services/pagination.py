@@ -0,0 +1,116 @@
+import base64
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_
+
+# Keyset (seek) pagination on (created_at, id), newest first. A page is found
+# with an index range scan from the cursor row, so page 5000 costs the same
+# as page 1, unlike OFFSET which reads and discards every row before it.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Page:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    # (created_at, id), or None for a missing or malformed cursor
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def page_size(default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE, arg='per_page'):
+    try:
+        size = int(request.args.get(arg, default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def keyset_page(query, model, after=None, before=None, per_page=DEFAULT_PAGE_SIZE):
+    # `after` moves to older rows (next page), `before` to newer rows (previous
+    # page); both are cursors from encode_cursor. query may carry filters but
+    # no ordering of its own.
+    created_at, row_id = model.created_at, model.id
+    before_key = decode_cursor(before)
+    after_key = decode_cursor(after)
+
+    if before_key:
+        ts, pk = before_key
+        query = query.filter(or_(created_at > ts, and_(created_at == ts, row_id > pk)))
+        rows = query.order_by(created_at.asc(), row_id.asc()).limit(per_page + 1).all()
+        more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        newer_exist, older_exist = more, True
+    else:
+        if after_key:
+            ts, pk = after_key
+            query = query.filter(or_(created_at < ts, and_(created_at == ts, row_id < pk)))
+        rows = query.order_by(created_at.desc(), row_id.desc()).limit(per_page + 1).all()
+        older_exist = len(rows) > per_page
+        items = rows[:per_page]
+        newer_exist = after_key is not None
+
+    next_cursor = prev_cursor = None
+    if items and older_exist:
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+    if items and newer_exist:
+        prev_cursor = encode_cursor(items[0].created_at, items[0].id)
+    return Page(items, per_page, next_cursor, prev_cursor)
+
+
+def paginate(query, model, per_page=None, after_arg='after', before_arg='before'):
+    # keyset_page() driven by the request's query string
+    return keyset_page(
+        query, model,
+        after=request.args.get(after_arg),
+        before=request.args.get(before_arg),
+        per_page=per_page or page_size(),
+    )
+
+
+def api_page(query, model, default=DEFAULT_PAGE_SIZE):
+    # Mobile API flavour: ?limit=N&before=<cursor>, newest first, where
+    # `before` is the X-Next-Cursor of the previous page and continues to
+    # older rows. The cursor is opaque to clients.
+    return keyset_page(
+        query, model,
+        after=request.args.get('before'),
+        per_page=page_size(default=default, arg='limit'),
+    )
+
+
+def cursor_headers(page):
+    # Absent on the last page
+    return {'X-Next-Cursor': page.next_cursor} if page.has_next else {}
@@ -0,0 +1,62 @@
+import os
+import random
+import uuid
+from models import db, QRBatch, QRCode
+
+# Rows per multi-row INSERT. Large enough to amortise round trips, small enough
+# that a million-code batch never holds more than one chunk in memory.
+CHUNK_SIZE = 5000
+
+# Standard distribution: 50% (10-30 points), 40% (31-50 points), 10% (51-80 points)
+POINT_TIERS = [
+    (0.5, 10, 30),
+    (0.4, 31, 50),
+]
+TOP_TIER = (51, 80)
+
+
+def tier_counts(qr_size):
+    distributions = []
+    remaining = qr_size
+    for share, min_p, max_p in POINT_TIERS:
+        count = int(qr_size * share)
+        distributions.append((count, min_p, max_p))
+        remaining -= count
+    distributions.append((remaining, TOP_TIER[0], TOP_TIER[1]))
+    return distributions
+
+
+def bulk_uuids(count):
+    # One urandom call per chunk instead of one uuid4() syscall per code
+    raw = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
+
+def iter_code_chunks(qr_size, chunk_size=CHUNK_SIZE):
+    # Yields (uuids, points) lists; each tier's points are drawn in one call
+    for count, min_p, max_p in tier_counts(qr_size):
+        population = range(min_p, max_p + 1)
+        for start in range(0, count, chunk_size):
+            size = min(chunk_size, count - start)
+            yield bulk_uuids(size), random.choices(population, k=size)
+
+
+def generate_batch(batch_name, qr_size, chunk_size=CHUNK_SIZE, on_chunk=None):
+    new_batch = QRBatch(batch_name=batch_name, total_qrs=qr_size, total_points=0)
+    db.session.add(new_batch)
+    db.session.flush() # Get batch ID
+
+    insert = QRCode.__table__.insert()
+    total_batch_points = 0
+    for uuids, points in iter_code_chunks(qr_size, chunk_size):
+        db.session.execute(insert, [
+            {'batch_id': new_batch.id, 'uuid': code, 'points': pts, 'is_redeemed': False}
+            for code, pts in zip(uuids, points)
+        ])
+        total_batch_points += sum(points)
+        if on_chunk:
+            on_chunk(uuids)
+
+    new_batch.total_points = total_batch_points
+    db.session.commit()
+    return new_batch
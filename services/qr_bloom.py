@@ -0,0 +1,165 @@
+import hashlib
+import math
+import threading
+from datetime import datetime
+from sqlalchemy import select, func
+from models import db, QRBatch, QRCode
+from services import shared_state
+
+ADDED_MARKER = 'qr_codes_added'
+DELETED_MARKER = 'qr_codes_deleted'
+
+# Never size the filter below this many codes, so small installs don't
+# rebuild on every new batch
+MIN_CAPACITY = 100000
+
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, item):
+        bits = self.bits
+        for pos in self._positions(item):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        for pos in self._positions(item):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def estimated_fp_rate(self):
+        if not self.count:
+            return 0.0
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class QRCodeFilter:
+    # Process-local Bloom filter of every issued QR uuid. A miss means the code
+    # was never issued, so /api/wallet/scan can reject it without a DB query.
+
+    def __init__(self):
+        self.enabled = False
+        self.fp_rate = 0.001
+        self.bloom = None
+        # Batches whose codes are in the filter. Ids are assigned at INSERT but
+        # become visible at COMMIT, possibly out of order, so a high-water mark
+        # would skip a batch that committed after a higher one
+        self.known_batches = set()
+        self.added_version = None
+        self.deleted_version = None
+        self.built_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('QR_FILTER_ENABLED', True)
+        self.fp_rate = app.config.get('QR_FILTER_FP_RATE', 0.001)
+        if self.enabled:
+            with app.app_context():
+                self.rebuild()
+
+    def rebuild(self):
+        with self._lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.added_version = shared_state.version(ADDED_MARKER)
+        self.deleted_version = shared_state.version(DELETED_MARKER)
+        total = db.session.execute(select(func.count(QRCode.id))).scalar()
+        bloom = BloomFilter(max(MIN_CAPACITY, int(total * 1.5)), self.fp_rate)
+        known = set()
+        # A batch's codes commit together, so one scan sees whole batches only
+        stmt = select(QRCode.uuid, QRCode.batch_id).execution_options(yield_per=10000)
+        for code, batch_id in db.session.execute(stmt):
+            bloom.add(code)
+            known.add(batch_id)
+        self.bloom = bloom
+        self.known_batches = known
+        self.built_at = datetime.utcnow()
+
+    def _load_new_batches(self):
+        self.added_version = shared_state.version(ADDED_MARKER)
+        # qr_batches is small; diff its ids against the batches already loaded
+        batch_ids = set(db.session.execute(select(QRBatch.id)).scalars())
+        new_batches = sorted(batch_ids - self.known_batches)
+        if new_batches:
+            stmt = (
+                select(QRCode.uuid)
+                .where(QRCode.batch_id.in_(new_batches))
+                .execution_options(yield_per=10000)
+            )
+            for code in db.session.execute(stmt).scalars():
+                self.bloom.add(code)
+            self.known_batches.update(new_batches)
+        if self.bloom.count > self.bloom.capacity:
+            self._rebuild()
+
+    def _refresh(self):
+        # Pick up batches created or deleted by other workers
+        if self.bloom is None or shared_state.version(DELETED_MARKER) != self.deleted_version:
+            self._rebuild()
+        elif shared_state.version(ADDED_MARKER) != self.added_version:
+            self._load_new_batches()
+
+    def might_contain(self, code):
+        if not self.enabled:
+            return True
+        with self._lock:
+            self._refresh()
+            return code in self.bloom
+
+    def add_codes(self, codes):
+        if not self.enabled or self.bloom is None:
+            return
+        with self._lock:
+            for code in codes:
+                self.bloom.add(code)
+
+    def batch_created(self, batch_id):
+        if not self.enabled:
+            return
+        with self._lock:
+            up_to_date = shared_state.version(ADDED_MARKER) == self.added_version
+            new_version = shared_state.bump(ADDED_MARKER)
+            # Codes were added chunk by chunk during generation
+            if up_to_date and self.bloom is not None:
+                self.added_version = new_version
+                self.known_batches.add(batch_id)
+
+    def batch_deleted(self):
+        if not self.enabled:
+            return
+        shared_state.bump(DELETED_MARKER)
+        self.rebuild()
+
+    def stats(self):
+        bloom = self.bloom
+        if not self.enabled or bloom is None:
+            return None
+        return {
+            'codes': bloom.count,
+            'capacity': bloom.capacity,
+            'memory_bytes': len(bloom.bits),
+            'num_hashes': bloom.num_hashes,
+            'target_fp_rate': bloom.fp_rate,
+            'estimated_fp_rate': bloom.estimated_fp_rate(),
+            'built_at': self.built_at,
+        }
+
+
+qr_filter = QRCodeFilter()
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import shutil
+import threading
+
+CACHE_DIRNAME = 'qr_cache'
+
+
+def cache_root(upload_folder):
+    return os.path.join(upload_folder, CACHE_DIRNAME)
+
+
+def batch_dir(root, batch_id):
+    return os.path.join(root, f"batch_{batch_id}")
+
+
+def entry_path(root, batch_id, code, settings, ext='png'):
+    # Content-addressed: same code + same render settings -> same file
+    key = hashlib.sha1(f"{code}|{settings}".encode()).hexdigest()
+    return os.path.join(batch_dir(root, batch_id), f"{key}.{ext}")
+
+
+def read_entry(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    # mtime doubles as the LRU clock
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def write_entry(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Inline renders run in request threads, so two downloads of the same
+    # batch can write one entry at once; each needs its own tmp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    # Atomic publish so concurrent readers never see a partial image
+    os.replace(tmp_path, path)
+
+
+def drop_batch(root, batch_id):
+    shutil.rmtree(batch_dir(root, batch_id), ignore_errors=True)
+
+
+def enforce_limit(root, max_bytes):
+    # Evict least recently used entries until the cache is back under 90% of the cap
+    if not os.path.isdir(root):
+        return 0
+    entries = []
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+    if total <= max_bytes:
+        return 0
+
+    target = int(max_bytes * 0.9)
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+    return evicted
@@ -0,0 +1,72 @@
+import zipfile
+from sqlalchemy import select
+from models import db, QRCode
+from services.qr_render import render_ordered, DEFAULT_SETTINGS
+from services.qr_cache import entry_path, enforce_limit
+
+# Rows fetched per server-side cursor round trip
+FETCH_SIZE = 1000
+
+
+class StreamBuffer:
+    # Write-only file object for ZipFile. It has no seek(), so zipfile falls
+    # back to data descriptors and never rewinds into bytes already sent.
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_batch_codes(batch_id):
+    stmt = (
+        select(QRCode.id, QRCode.uuid, QRCode.points)
+        .where(QRCode.batch_id == batch_id)
+        .order_by(QRCode.id)
+        .execution_options(yield_per=FETCH_SIZE)
+    )
+    for row in db.session.execute(stmt):
+        yield row
+
+
+def stream_zip(entries, compress_type=zipfile.ZIP_STORED):
+    # entries yields (filename, bytes); each entry is flushed to the client as
+    # soon as it is written, so memory stays at one image regardless of size
+    buf = StreamBuffer()
+    with zipfile.ZipFile(buf, 'w', compress_type) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+            yield buf.drain()
+    yield buf.drain()
+
+
+def zip_compression(settings):
+    # PNG is already deflated; SVG text shrinks several times over
+    return zipfile.ZIP_DEFLATED if settings.fmt == 'svg' else zipfile.ZIP_STORED
+
+
+def batch_image_entries(batch_id, settings=DEFAULT_SETTINGS, workers=None, cache_root=None, cache_max_bytes=None):
+    def job(row):
+        path = entry_path(cache_root, batch_id, row.uuid, settings.key, settings.ext) if cache_root else None
+        return row.uuid, path
+
+    rows = iter_batch_codes(batch_id)
+    for (qr_id, code, points), data in render_ordered(rows, key=job, settings=settings, workers=workers):
+        yield f"qr_{qr_id}_{points}pts.{settings.ext}", data
+
+    if cache_root and cache_max_bytes:
+        enforce_limit(cache_root, cache_max_bytes)
@@ -0,0 +1,179 @@
+import atexit
+import multiprocessing
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import qrcode
+from PIL import Image
+from services.qr_cache import read_entry, write_entry
+
+# Codes per task sent to the pool; big enough to hide IPC overhead
+RENDER_CHUNK = 64
+
+# Export formats for batch downloads:
+#   png  - legacy qrcode.make() output (box 10, border 4)
+#   png1 - 1-bit PNG built straight from the module matrix, optimize=True
+#   svg  - one vector path with horizontal runs merged
+FORMATS = ('png', 'png1', 'svg')
+FORMAT_EXTENSIONS = {'png': 'png', 'png1': 'png', 'svg': 'svg'}
+
+
+class RenderSettings(namedtuple('RenderSettings', ['fmt', 'box_size', 'border'])):
+    __slots__ = ()
+
+    @property
+    def ext(self):
+        return FORMAT_EXTENSIONS[self.fmt]
+
+    @property
+    def key(self):
+        # Part of the cache key: changes whenever the rendered output would
+        return f"{self.fmt}:{self.box_size}:{self.border}"
+
+
+DEFAULT_SETTINGS = RenderSettings('png', 10, 4)
+
+_pool = None
+_pool_pid = None
+_pool_workers = None
+
+
+def make_settings(fmt=None, box_size=None, border=None):
+    fmt = fmt if fmt in FORMATS else DEFAULT_SETTINGS.fmt
+    box_size = min(max(int(box_size or DEFAULT_SETTINGS.box_size), 1), 40)
+    border = DEFAULT_SETTINGS.border if border in (None, '') else min(max(int(border), 0), 10)
+    return RenderSettings(fmt, box_size, border)
+
+
+def qr_matrix(code, border):
+    qr = qrcode.QRCode(border=border)
+    qr.add_data(code)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_png(code, settings=DEFAULT_SETTINGS):
+    qr = qrcode.QRCode(box_size=settings.box_size, border=settings.border)
+    qr.add_data(code)
+    qr.make(fit=True)
+    img = qr.make_image()
+    img_io = BytesIO()
+    img.save(img_io, 'PNG')
+    return img_io.getvalue()
+
+
+def render_png1(code, settings):
+    # One pixel per module, then a nearest-neighbour upscale: no per-module drawing
+    matrix = qr_matrix(code, settings.border)
+    size = len(matrix)
+    img = Image.new('1', (size, size), 1)
+    img.putdata([0 if dark else 1 for row in matrix for dark in row])
+    if settings.box_size > 1:
+        img = img.resize((size * settings.box_size, size * settings.box_size), Image.NEAREST)
+    img_io = BytesIO()
+    img.save(img_io, 'PNG', optimize=True)
+    return img_io.getvalue()
+
+
+def render_svg(code, settings):
+    matrix = qr_matrix(code, settings.border)
+    size = len(matrix)
+    parts = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                parts.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    mm = size * settings.box_size / 10
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{mm:g}mm" height="{mm:g}mm" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path fill="#000" d="{"".join(parts)}"/></svg>'
+    ).encode()
+
+
+RENDERERS = {'png': render_png, 'png1': render_png1, 'svg': render_svg}
+
+
+def render_image(code, settings=DEFAULT_SETTINGS):
+    return RENDERERS[settings.fmt](code, settings)
+
+
+def render_cached(code, settings=DEFAULT_SETTINGS, cache_path=None):
+    if cache_path:
+        data = read_entry(cache_path)
+        if data is not None:
+            return data
+    data = render_image(code, settings)
+    if cache_path:
+        write_entry(cache_path, data)
+    return data
+
+
+def render_chunk(settings, jobs):
+    return [render_cached(code, settings, cache_path) for code, cache_path in jobs]
+
+
+def default_workers():
+    return max(1, os.cpu_count() or 1)
+
+
+def get_pool(workers):
+    global _pool, _pool_pid, _pool_workers
+    # Each gunicorn worker owns its pool; never reuse one inherited over fork
+    if _pool is None or _pool_pid != os.getpid() or _pool_workers != workers:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False)
+        # spawn, not fork: the parent is a threaded web worker
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _pool_pid = os.getpid()
+        _pool_workers = workers
+    return _pool
+
+
+@atexit.register
+def shutdown_pool():
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_ordered(items, key, settings=DEFAULT_SETTINGS, workers=None, chunk_size=RENDER_CHUNK):
+    # key(item) returns (code, cache_path or None). Yields (item, png) in input
+    # order; at most two chunks per worker are in flight, so memory stays bounded.
+    workers = workers or default_workers()
+    if workers <= 1:
+        for item in items:
+            code, cache_path = key(item)
+            yield item, render_cached(code, settings, cache_path)
+        return
+
+    pool = get_pool(workers)
+    pending = deque()
+    for chunk in _chunks(items, chunk_size):
+        pending.append((chunk, pool.submit(render_chunk, settings, [key(item) for item in chunk])))
+        if len(pending) >= workers * 2:
+            done_chunk, future = pending.popleft()
+            yield from zip(done_chunk, future.result())
+    while pending:
+        done_chunk, future = pending.popleft()
+        yield from zip(done_chunk, future.result())
@@ -0,0 +1,99 @@
+import logging
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from models import db
+from services.metrics import request_metrics
+
+logger = logging.getLogger(__name__)
+
+# Per-request SQL accounting, hooked into the engine's cursor events:
+#   * statement count and DB time per request, fed to /admin/metrics
+#   * a warning when one request repeats the same statement shape more than
+#     QUERY_REPEAT_WARN times, which is what a lazy load in a loop (N+1) looks like
+#   * query budgets: @query_budget(n) on a view, or QUERY_BUDGETS by endpoint.
+#     Over budget raises QueryBudgetExceeded when QUERY_BUDGET_ENFORCE is on
+#     (defaults to app.testing), otherwise it logs a warning.
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    # Declares how many statements a view may run per request
+    # (place it below @login_required, whose functools.wraps copies the attribute)
+    def decorator(view):
+        view._query_budget = max_queries
+        return view
+    return decorator
+
+
+class QueryStats:
+    def __init__(self):
+        self.repeat_warn = 10
+
+    def init_app(self, app):
+        self.repeat_warn = app.config.get('QUERY_REPEAT_WARN', 10)
+        with app.app_context():
+            for engine in db.engines.values():
+                if not event.contains(engine, 'before_cursor_execute', self._before_cursor_execute):
+                    event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                    event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g._query_count = 0
+        g._query_seconds = 0.0
+        g._query_shapes = Counter()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and '_query_shapes' in g:
+            conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Only statements run by request handlers; background writers have no request
+        if not has_request_context() or '_query_shapes' not in g:
+            return
+        starts = conn.info.get('_query_start')
+        if starts:
+            g._query_seconds += time.perf_counter() - starts.pop()
+        g._query_count += 1
+        g._query_shapes[statement] += 1
+
+    def _after_request(self, response):
+        if '_query_shapes' not in g:
+            return response
+        count, seconds = g._query_count, g._query_seconds
+        endpoint = request.endpoint or 'unmatched'
+        request_metrics.observe_queries(endpoint, count, seconds)
+
+        if current_app.config.get('QUERY_STATS_HEADERS', False):
+            response.headers['X-Query-Count'] = str(count)
+            response.headers['Server-Timing'] = f"db;dur={seconds * 1000:.1f}"
+
+        for statement, repeats in g._query_shapes.most_common():
+            if repeats <= self.repeat_warn:
+                break
+            logger.warning("Possible N+1 on %s: statement ran %d times in one request: %s",
+                           endpoint, repeats, ' '.join(statement.split())[:300])
+
+        budget = self.budget_for(endpoint)
+        if budget is not None and count > budget:
+            message = f"{endpoint} ran {count} queries, budget is {budget}"
+            if current_app.config.get('QUERY_BUDGET_ENFORCE', current_app.testing):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def budget_for(self, endpoint):
+        budgets = current_app.config.get('QUERY_BUDGETS') or {}
+        if endpoint in budgets:
+            return budgets[endpoint]
+        view = current_app.view_functions.get(endpoint)
+        return getattr(view, '_query_budget', None)
+
+
+query_stats = QueryStats()
@@ -0,0 +1,141 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from sqlalchemy import select, update, insert, case
+from models import db, User, Reward, RedemptionRequest, Transaction
+from services.scans import supports_returning
+from services.ledger import REFUND
+
+# Bulk processing of the redemption queue. Requests are picked by id or by
+# filter, flipped from pending in chunked conditional UPDATEs (a request
+# another admin already handled is simply not matched), and for rejections
+# the refunds are summed per user and the restocks per reward, so each user
+# and reward is written once however many of their requests were in the
+# set. Everything commits together or not at all.
+
+ACTIONS = {'approve': 'approved', 'reject': 'rejected'}
+CHUNK_SIZE = 500
+
+
+def _targets(reward_id=None, start=None, end=None):
+    criteria = [RedemptionRequest.status == 'pending']
+    if reward_id:
+        criteria.append(RedemptionRequest.reward_id == reward_id)
+    if start:
+        criteria.append(RedemptionRequest.created_at >= start)
+    if end:
+        # end is inclusive of the whole day
+        criteria.append(RedemptionRequest.created_at < end + timedelta(days=1))
+    return list(db.session.execute(
+        select(RedemptionRequest.id).where(*criteria).order_by(RedemptionRequest.id)
+    ).scalars())
+
+
+def _flip(chunk, status):
+    # Returns (user_id, reward_id) for the requests this call moved off pending
+    stmt = (
+        update(RedemptionRequest)
+        .where(RedemptionRequest.id.in_(chunk), RedemptionRequest.status == 'pending')
+        .values(status=status)
+        .execution_options(synchronize_session=False)
+    )
+    if supports_returning():
+        return db.session.execute(stmt.returning(RedemptionRequest.user_id, RedemptionRequest.reward_id)).all()
+
+    rows = db.session.execute(
+        select(RedemptionRequest.id, RedemptionRequest.user_id, RedemptionRequest.reward_id)
+        .where(RedemptionRequest.id.in_(chunk), RedemptionRequest.status == 'pending')
+        .with_for_update()
+    ).all()
+    if rows:
+        db.session.execute(stmt.where(RedemptionRequest.id.in_([r.id for r in rows])))
+    return [(r.user_id, r.reward_id) for r in rows]
+
+
+def take_stock(reward_id):
+    # Conditional decrement; False when the reward is sold out (or gone)
+    return db.session.execute(
+        update(Reward)
+        .where(Reward.id == reward_id, Reward.stock > 0)
+        .values(stock=Reward.stock - 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def _add_to(model, column, amounts):
+    # column += amounts[id] for every id, CHUNK_SIZE rows per UPDATE
+    keys = list(amounts)
+    for i in range(0, len(keys), CHUNK_SIZE):
+        part = {key: amounts[key] for key in keys[i:i + CHUNK_SIZE]}
+        db.session.execute(
+            update(model)
+            .where(model.id.in_(list(part)))
+            .values({column: getattr(model, column) + case(part, value=model.id, else_=0)})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def process(action, ids=None, reward_id=None, start=None, end=None, all_pending=False):
+    # Approves or rejects (with refund) every pending request matching the
+    # ids/filter and returns a summary dict. Requests that are not pending
+    # are skipped. An empty filter must be asked for with all_pending, so a
+    # malformed call cannot sweep the whole queue.
+    status = ACTIONS[action]
+    if ids is None and not (reward_id or start or end or all_pending):
+        raise ValueError("Choose a reward or dates, or set all to process every pending request")
+    # Ticked ids go straight to the conditional UPDATE, which skips non-pending ones
+    targets = sorted(set(ids)) if ids is not None else _targets(reward_id, start, end)
+    summary = {
+        "action": action,
+        "requested": len(set(ids)) if ids is not None else len(targets),
+        "processed": 0,
+        "skipped": 0,
+        "users": 0,
+        "rewards": 0,
+        "points_refunded": 0,
+        "stock_restored": 0,
+    }
+    try:
+        flipped = []
+        for i in range(0, len(targets), CHUNK_SIZE):
+            flipped += _flip(targets[i:i + CHUNK_SIZE], status)
+
+        if action == 'reject' and flipped:
+            per_reward = Counter(reward_id for _, reward_id in flipped)
+            rewards = {r.id: r for r in db.session.execute(
+                select(Reward.id, Reward.name, Reward.points_required).where(Reward.id.in_(list(per_reward)))
+            )}
+            refunds = defaultdict(int)
+            refunded = defaultdict(list)
+            for user_id, reward_id in flipped:
+                reward = rewards.get(reward_id)
+                if reward is not None:
+                    refunds[user_id] += reward.points_required
+                    refunded[user_id].append(reward.name)
+
+            _add_to(User, 'points', refunds)
+            _add_to(Reward, 'stock', {rid: n for rid, n in per_reward.items() if rid in rewards})
+            # One ledger entry per user for everything refunded to them
+            rows = [{
+                "user_id": user_id,
+                "amount": amount,
+                "type": REFUND,
+                "description": (f"Refund for rejected reward: {refunded[user_id][0]}"
+                                if len(refunded[user_id]) == 1
+                                else f"Refund for {len(refunded[user_id])} rejected rewards"),
+            } for user_id, amount in refunds.items()]
+            for i in range(0, len(rows), CHUNK_SIZE):
+                db.session.execute(insert(Transaction), rows[i:i + CHUNK_SIZE])
+
+            summary["points_refunded"] = sum(refunds.values())
+            summary["stock_restored"] = sum(n for rid, n in per_reward.items() if rid in rewards)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    summary["processed"] = len(flipped)
+    summary["skipped"] = summary["requested"] - len(flipped)
+    summary["users"] = len({user_id for user_id, _ in flipped})
+    summary["rewards"] = len({reward_id for _, reward_id in flipped})
+    return summary
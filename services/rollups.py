@@ -0,0 +1,254 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, func, update, delete, literal_column
+from sqlalchemy.exc import IntegrityError
+from models import (db, QRCode, User, Transaction, RedemptionRequest, Reward,
+                    DailyBatchStat, DailyRewardStat, DailyStateStat, RollupState)
+from services.batch_analytics import bucket_expr
+from services.ledger import SPEND_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Daily rollups (per batch, per reward, per state) maintained incrementally.
+# rollup_state holds a high-water timestamp: each refresh claims the window
+# [high_water, now - lag) by advancing it with a conditional UPDATE, folds
+# the source rows from that window into the rollup tables and commits both
+# together, so every source row is counted exactly once even with several
+# workers refreshing. The lag leaves room for transactions that took their
+# timestamp before committing.
+
+STATE = 'daily'
+UNKNOWN_STATE = 'Unknown'
+
+
+class Rollups:
+    def __init__(self):
+        self.app = None
+        self.lag = timedelta(seconds=120)
+        self.refresh_interval = 60
+        self.auto_refresh = False
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.lag = timedelta(seconds=app.config.get('ROLLUP_LAG_SECONDS', 120))
+        self.refresh_interval = app.config.get('ROLLUP_REFRESH_SECONDS', 60)
+        self.auto_refresh = app.config.get('ROLLUP_AUTO_REFRESH', True)
+
+    def ensure_refreshing(self):
+        # One background refresher per gunicorn worker, started on first read
+        # so request handlers never pay for folding new rows in
+        if not self.auto_refresh or self.app is None:
+            return
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='rollup-refresher', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    self.refresh()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Rollup refresh failed")
+            time.sleep(self.refresh_interval)
+
+    def refresh(self, until=None):
+        cutoff = until or datetime.utcnow() - self.lag
+        state = db.session.get(RollupState, STATE)
+        start = state.high_water if state else None
+        if start is not None and start >= cutoff:
+            return 0
+
+        # Claim the window; a concurrent refresh loses here and does nothing
+        if state is None:
+            try:
+                db.session.add(RollupState(name=STATE, high_water=cutoff))
+                db.session.flush()
+            except IntegrityError:
+                db.session.rollback()
+                return 0
+        else:
+            claimed = db.session.execute(
+                update(RollupState)
+                .where(RollupState.name == STATE, RollupState.high_water == start)
+                .values(high_water=cutoff)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if claimed != 1:
+                db.session.rollback()
+                return 0
+
+        rows = self._apply(start, cutoff)
+        db.session.commit()
+        return rows
+
+    def rebuild(self, until=None):
+        # Backfill: drop every rollup row and fold the whole history again
+        for model in (DailyBatchStat, DailyRewardStat, DailyStateStat, RollupState):
+            db.session.execute(delete(model))
+        db.session.commit()
+        return self.refresh(until=until)
+
+    def _apply(self, start, end):
+        batches = defaultdict(lambda: [0, 0])
+        rewards = defaultdict(lambda: [0, 0])
+        states = defaultdict(lambda: [0, 0, 0, 0])
+
+        def window(column):
+            criteria = [column < end]
+            if start is not None:
+                criteria.append(column >= start)
+            return criteria
+
+        scan_day = bucket_expr(QRCode.redeemed_at, 'day').label('day')
+        for row in db.session.execute(
+            select(scan_day, QRCode.batch_id, func.count(QRCode.id), func.sum(QRCode.points))
+            .where(QRCode.is_redeemed == True, *window(QRCode.redeemed_at))
+            .group_by(literal_column('day'), QRCode.batch_id)
+        ):
+            batches[(row[0], row[1])] = [row[2], row[3] or 0]
+
+        for row in db.session.execute(
+            select(scan_day, User.state, func.count(QRCode.id), func.sum(QRCode.points))
+            .outerjoin(User, User.id == QRCode.redeemed_by)
+            .where(QRCode.is_redeemed == True, *window(QRCode.redeemed_at))
+            .group_by(literal_column('day'), User.state)
+        ):
+            totals = states[(row[0], row[1] or UNKNOWN_STATE)]
+            totals[0] += row[2]
+            totals[1] += row[3] or 0
+
+        spend_day = bucket_expr(Transaction.created_at, 'day').label('day')
+        for row in db.session.execute(
+            # spend rows store a negative amount; refunds are positive and net it off
+            select(spend_day, User.state, -func.sum(Transaction.amount))
+            .outerjoin(User, User.id == Transaction.user_id)
+            .where(Transaction.type.in_(SPEND_TYPES), *window(Transaction.created_at))
+            .group_by(literal_column('day'), User.state)
+        ):
+            states[(row[0], row[1] or UNKNOWN_STATE)][2] += row[2] or 0
+
+        join_day = bucket_expr(User.created_at, 'day').label('day')
+        for row in db.session.execute(
+            select(join_day, User.state, func.count(User.id))
+            .where(*window(User.created_at))
+            .group_by(literal_column('day'), User.state)
+        ):
+            states[(row[0], row[1] or UNKNOWN_STATE)][3] += row[2]
+
+        request_day = bucket_expr(RedemptionRequest.created_at, 'day').label('day')
+        for row in db.session.execute(
+            select(request_day, RedemptionRequest.reward_id, func.count(RedemptionRequest.id),
+                   func.sum(Reward.points_required))
+            .outerjoin(Reward, Reward.id == RedemptionRequest.reward_id)
+            .where(*window(RedemptionRequest.created_at))
+            .group_by(literal_column('day'), RedemptionRequest.reward_id)
+        ):
+            rewards[(row[0], row[1])] = [row[2], row[3] or 0]
+
+        written = 0
+        for (day, batch_id), (scans, points) in batches.items():
+            written += _add(DailyBatchStat, {'day': _day(day), 'batch_id': batch_id},
+                            {'scans': scans, 'points': points})
+        for (day, reward_id), (count, points) in rewards.items():
+            written += _add(DailyRewardStat, {'day': _day(day), 'reward_id': reward_id},
+                            {'requests': count, 'points': points})
+        for (day, state), (scans, earned, spent, joined) in states.items():
+            written += _add(DailyStateStat, {'day': _day(day), 'state': state},
+                            {'scans': scans, 'points_earned': earned, 'points_spent': spent, 'new_users': joined})
+        return written
+
+    # Readers
+
+    def daily_activity(self, days=14):
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        rows = db.session.execute(
+            select(DailyStateStat.day,
+                   func.sum(DailyStateStat.scans), func.sum(DailyStateStat.points_earned),
+                   func.sum(DailyStateStat.points_spent), func.sum(DailyStateStat.new_users))
+            .where(DailyStateStat.day >= since)
+            .group_by(DailyStateStat.day)
+        ).all()
+        by_day = {row[0]: row for row in rows}
+        series = []
+        for offset in range(days):
+            day = since + timedelta(days=offset)
+            row = by_day.get(day)
+            series.append({
+                'day': day.isoformat(),
+                'scans': row[1] if row else 0,
+                'points_earned': row[2] if row else 0,
+                'points_spent': row[3] if row else 0,
+                'new_users': row[4] if row else 0,
+            })
+        return series
+
+    def top_states(self, days=30, limit=5):
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        scans = func.sum(DailyStateStat.scans)
+        rows = db.session.execute(
+            select(DailyStateStat.state, scans, func.sum(DailyStateStat.points_earned))
+            .where(DailyStateStat.day >= since)
+            .group_by(DailyStateStat.state)
+            .order_by(scans.desc())
+            .limit(limit)
+        )
+        return [{'state': row[0], 'scans': row[1], 'points_earned': row[2]} for row in rows]
+
+    def reward_totals(self, days=30):
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        requests = func.sum(DailyRewardStat.requests)
+        rows = db.session.execute(
+            select(DailyRewardStat.reward_id, Reward.name, requests, func.sum(DailyRewardStat.points))
+            .outerjoin(Reward, Reward.id == DailyRewardStat.reward_id)
+            .where(DailyRewardStat.day >= since)
+            .group_by(DailyRewardStat.reward_id, Reward.name)
+            .order_by(requests.desc())
+        )
+        return [{'reward_id': row[0], 'reward': row[1], 'requests': row[2], 'points': row[3]} for row in rows]
+
+    def batch_daily(self, days=30):
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        rows = db.session.execute(
+            select(DailyBatchStat.day, DailyBatchStat.batch_id, DailyBatchStat.scans, DailyBatchStat.points)
+            .where(DailyBatchStat.day >= since)
+            .order_by(DailyBatchStat.day, DailyBatchStat.batch_id)
+        )
+        return [{'day': row[0].isoformat(), 'batch_id': row[1], 'scans': row[2], 'points': row[3]} for row in rows]
+
+    def drop_batch(self, batch_id):
+        # Caller commits; keeps a reused batch id from inheriting old rows
+        db.session.execute(delete(DailyBatchStat).where(DailyBatchStat.batch_id == batch_id))
+
+
+def _day(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _add(model, key, deltas):
+    # Add deltas to a rollup row, creating it on first use
+    criteria = [getattr(model, column) == value for column, value in key.items()]
+    changed = db.session.execute(
+        update(model).where(*criteria)
+        .values({column: getattr(model, column) + value for column, value in deltas.items()})
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not changed:
+        db.session.execute(model.__table__.insert().values(**key, **deltas))
+    return 1
+
+
+rollups = Rollups()
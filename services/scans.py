@@ -0,0 +1,112 @@
+from sqlalchemy import select, update
+from models import db, User, QRBatch, QRCode
+
+
+def supports_returning():
+    dialect = db.session.get_bind().dialect
+    return getattr(dialect, 'update_returning', getattr(dialect, 'full_returning', False))
+
+
+def claim_code(uuid_code, user_id, now):
+    # Flip is_redeemed in a single conditional UPDATE. Whoever's UPDATE matches
+    # the row first wins; every concurrent scan of the same code matches nothing.
+    stmt = (
+        update(QRCode)
+        .where(QRCode.uuid == uuid_code, QRCode.is_redeemed == False)
+        .values(is_redeemed=True, redeemed_by=user_id, redeemed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if supports_returning():
+        return db.session.execute(stmt.returning(QRCode.points, QRCode.batch_id)).first()
+
+    if db.session.execute(stmt).rowcount != 1:
+        return None
+    return db.session.execute(
+        select(QRCode.points, QRCode.batch_id).where(QRCode.uuid == uuid_code)
+    ).first()
+
+
+def credit_points(user_id, amount):
+    # In-database increment; returns (points, name) or None if the user is gone
+    stmt = (
+        update(User)
+        .where(User.id == user_id)
+        .values(points=User.points + amount)
+        .execution_options(synchronize_session=False)
+    )
+    if supports_returning():
+        return db.session.execute(stmt.returning(User.points, User.name)).first()
+
+    if db.session.execute(stmt).rowcount != 1:
+        return None
+    return db.session.execute(select(User.points, User.name).where(User.id == user_id)).first()
+
+
+def debit_points(user_id, amount):
+    # Conditional in-database decrement: never takes a balance below zero,
+    # however many requests race. Returns (points, name), or None when the
+    # user is gone or cannot afford it.
+    stmt = (
+        update(User)
+        .where(User.id == user_id, User.points >= amount)
+        .values(points=User.points - amount)
+        .execution_options(synchronize_session=False)
+    )
+    if supports_returning():
+        return db.session.execute(stmt.returning(User.points, User.name)).first()
+
+    if db.session.execute(stmt).rowcount != 1:
+        return None
+    return db.session.execute(select(User.points, User.name).where(User.id == user_id)).first()
+
+
+def code_exists(uuid_code):
+    return db.session.execute(select(QRCode.id).where(QRCode.uuid == uuid_code)).first() is not None
+
+
+def batch_name(batch_id):
+    return db.session.execute(select(QRBatch.batch_name).where(QRBatch.id == batch_id)).scalar()
+
+
+def bump_batch_counters(batch_id, count, points):
+    # Keeps QRBatch.redeemed_count/redeemed_points in step with the claim;
+    # returns the batch name so the scan path needs no separate lookup
+    stmt = (
+        update(QRBatch)
+        .where(QRBatch.id == batch_id)
+        .values(redeemed_count=QRBatch.redeemed_count + count,
+                redeemed_points=QRBatch.redeemed_points + points)
+        .execution_options(synchronize_session=False)
+    )
+    if supports_returning():
+        return db.session.execute(stmt.returning(QRBatch.batch_name)).scalar()
+    db.session.execute(stmt)
+    return batch_name(batch_id)
+
+
+def claim_codes(uuid_codes, user_id, now):
+    # Set-based claim for carton scans: returns [(uuid, points, batch_id)]
+    # for the codes this request won
+    if not supports_returning():
+        claimed = []
+        for code in uuid_codes:
+            row = claim_code(code, user_id, now)
+            if row:
+                claimed.append((code, row.points, row.batch_id))
+        return claimed
+
+    stmt = (
+        update(QRCode)
+        .where(QRCode.uuid.in_(uuid_codes), QRCode.is_redeemed == False)
+        .values(is_redeemed=True, redeemed_by=user_id, redeemed_at=now)
+        .returning(QRCode.uuid, QRCode.points, QRCode.batch_id)
+        .execution_options(synchronize_session=False)
+    )
+    return [tuple(row) for row in db.session.execute(stmt)]
+
+
+def existing_codes(uuid_codes):
+    if not uuid_codes:
+        return set()
+    return set(db.session.execute(select(QRCode.uuid).where(QRCode.uuid.in_(uuid_codes))).scalars())
+
@@ -0,0 +1,40 @@
+import os
+import threading
+import time
+
+# Cross-worker change markers. Gunicorn workers do not share memory, so a
+# worker that changes data bumps a marker file and the others notice on their
+# next check with a single stat() call, without touching the database.
+
+_state_dir = None
+
+
+def init_app(app):
+    global _state_dir
+    _state_dir = app.config['SHARED_STATE_DIR']
+    os.makedirs(_state_dir, exist_ok=True)
+
+
+def _marker(name):
+    return os.path.join(_state_dir, name)
+
+
+def version(name):
+    try:
+        st = os.stat(_marker(name))
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def bump(name):
+    if _state_dir is None:
+        return None
+    path = _marker(name)
+    # One tmp file per thread, so concurrent bumps never replace each other's
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(str(time.time_ns()))
+    # replace() gives the marker a new inode, so the version always changes
+    os.replace(tmp_path, path)
+    return version(name)
@@ -0,0 +1,26 @@
+from sqlalchemy import select, func
+from models import db, Transaction, RedemptionRequest, Notification
+from services.ledger import SPEND_TYPES
+
+
+def _total(*criteria):
+    return select(func.coalesce(func.sum(Transaction.amount), 0)).where(*criteria).scalar_subquery()
+
+
+def _count(model, *criteria):
+    return select(func.count(model.id)).where(*criteria).scalar_subquery()
+
+
+def profile_summary(user_id):
+    # Lifetime totals for the profile header in one round trip; the history
+    # lists themselves are fetched page by page from the JSON endpoints
+    return db.session.execute(select(
+        _total(Transaction.user_id == user_id, Transaction.type == 'earn').label('total_earned'),
+        # Spends are stored as negative amounts
+        (-_total(Transaction.user_id == user_id, Transaction.type.in_(SPEND_TYPES))).label('total_spent'),
+        _count(Transaction, Transaction.user_id == user_id).label('transaction_count'),
+        _count(RedemptionRequest, RedemptionRequest.user_id == user_id).label('redemption_count'),
+        _count(RedemptionRequest, RedemptionRequest.user_id == user_id,
+               RedemptionRequest.status == 'pending').label('pending_redemptions'),
+        _count(Notification, Notification.user_id == user_id).label('message_count'),
+    )).one()
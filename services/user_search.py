@@ -0,0 +1,203 @@
+import logging
+import re
+from sqlalchemy import event, inspect, text, func, or_
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+# Indexed user search for the admin directory.
+#   SQLite:   an FTS5 table (users_fts, rowid = users.id) holding name, city,
+#             state and the phone digits both forwards and reversed, so a
+#             phone suffix becomes a prefix query. Prefix indexes make short,
+#             as-you-type terms cheap. Kept in step by User mapper events,
+#             inside the same transaction as the change.
+#   Postgres: pg_trgm GIN indexes on the searched columns; ILIKE '%term%'
+#             and similarity() ranking use them directly, nothing to sync.
+# Anything else (or SQLite without FTS5) keeps the plain ILIKE filters.
+
+FTS_TABLE = 'users_fts'
+INDEXED = ('name', 'phone', 'city', 'state')
+# bm25 weights, in users_fts column order: name, phone, phone_rev, city, state
+FTS_WEIGHTS = (10.0, 5.0, 5.0, 2.0, 1.0)
+TRGM_COLUMNS = ('name', 'phone', 'city', 'state')
+REINDEX_CHUNK = 1000
+
+_mode = None
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def _words(term):
+    return re.findall(r'\w+', term or '')
+
+
+def _fts_row(user_id, name, phone, city, state):
+    digits = _digits(phone)
+    return {'id': user_id, 'name': name or '', 'phone': digits, 'phone_rev': digits[::-1],
+            'city': city or '', 'state': state or ''}
+
+
+def init_app(app):
+    global _mode
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite' and _fts5_available():
+            _mode = 'fts5'
+            _create_fts_table()
+        elif dialect == 'postgresql':
+            _mode = 'trgm' if _create_trgm_indexes() else None
+        else:
+            _mode = None
+    if _mode == 'fts5' and not _listening():
+        event.listen(User, 'after_insert', _after_insert)
+        event.listen(User, 'after_update', _after_update)
+        event.listen(User, 'after_delete', _after_delete)
+
+
+def _listening():
+    return event.contains(User, 'after_insert', _after_insert)
+
+
+def _fts5_available():
+    with db.engine.connect() as conn:
+        return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def _create_fts_table():
+    with db.engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first()
+        if exists:
+            return
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, phone, phone_rev, city, state, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+        ))
+    rebuild()
+
+
+def _create_trgm_indexes():
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for column in TRGM_COLUMNS:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_users_{column}_trgm ON users USING gin ({column} gin_trgm_ops)"
+                ))
+        return True
+    except Exception:
+        # Usually missing rights to CREATE EXTENSION; plain ILIKE still works
+        logger.exception("pg_trgm unavailable, user search falls back to unindexed ILIKE")
+        return False
+
+
+def rebuild():
+    # Repopulates users_fts from users; run after restoring a database or
+    # importing users outside the ORM. Returns the number of users indexed.
+    if _mode != 'fts5':
+        return 0
+    total = 0
+    with db.engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        result = conn.execution_options(yield_per=REINDEX_CHUNK).execute(
+            db.select(User.id, User.name, User.phone, User.city, User.state)
+        )
+        for rows in result.partitions():
+            conn.execute(_insert_sql(), [_fts_row(*row) for row in rows])
+            total += len(rows)
+    return total
+
+
+def _insert_sql():
+    return text(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, phone, phone_rev, city, state) "
+        "VALUES (:id, :name, :phone, :phone_rev, :city, :state)"
+    )
+
+
+def _after_insert(mapper, connection, user):
+    connection.execute(_insert_sql(), _fts_row(user.id, user.name, user.phone, user.city, user.state))
+
+
+def _after_update(mapper, connection, user):
+    state = inspect(user)
+    if not any(state.attrs[attr].history.has_changes() for attr in INDEXED):
+        return
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': user.id})
+    _after_insert(mapper, connection, user)
+
+
+def _after_delete(mapper, connection, user):
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': user.id})
+
+
+def _fts_terms(column, term):
+    return ' AND '.join(f'{column} : "{word}"*' for word in _words(term))
+
+
+def _fts_match(name=None, phone=None, city=None, state=None, q=None):
+    clauses = []
+    for column, term in (('name', name), ('city', city), ('state', state)):
+        if _words(term):
+            clauses.append(f'({_fts_terms(column, term)})')
+    digits = _digits(phone)
+    if digits:
+        # Leading digits or trailing digits of the number
+        clauses.append(f'(phone : "{digits}"* OR phone_rev : "{digits[::-1]}"*)')
+    if q:
+        words = _words(q)
+        parts = [f'"{word}"*' for word in words]
+        q_digits = _digits(q)
+        if q_digits and q_digits == ''.join(words):
+            parts = [f'(phone : "{q_digits}"* OR phone_rev : "{q_digits[::-1]}"*)']
+        if parts:
+            clauses.append(f"({' AND '.join(parts)})")
+    return ' AND '.join(clauses)
+
+
+def filter_users(query, name=None, phone=None, city=None, state=None):
+    # Applies the admin directory's field filters to a User query
+    if _mode == 'fts5':
+        match = _fts_match(name=name, phone=phone, city=city, state=state)
+        if match:
+            ids = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match").bindparams(match=match)
+            query = query.filter(User.id.in_(ids.columns(db.column('rowid', db.Integer))))
+        return query
+
+    for column, term in ((User.name, name), (User.city, city), (User.state, state)):
+        if term:
+            query = query.filter(column.ilike(f"%{term}%"))
+    if phone:
+        query = query.filter(User.phone.ilike(f"%{phone}%"))
+    return query
+
+
+def search_users(q, limit):
+    # Best matches for a free-text term across all indexed columns
+    if not q or not q.strip():
+        return []
+    if _mode == 'fts5':
+        match = _fts_match(q=q)
+        if not match:
+            return []
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        ids = db.session.execute(
+            text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+                 f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT :limit"),
+            {'match': match, 'limit': limit},
+        ).scalars().all()
+        users = {u.id: u for u in User.query.filter(User.id.in_(ids))} if ids else {}
+        return [users[i] for i in ids if i in users]
+
+    pattern = f"%{q.strip()}%"
+    query = User.query.filter(or_(*(getattr(User, c).ilike(pattern) for c in TRGM_COLUMNS)))
+    if _mode == 'trgm':
+        query = query.order_by(func.greatest(
+            *(func.similarity(getattr(User, c), q.strip()) for c in TRGM_COLUMNS)).desc())
+    else:
+        query = query.order_by(User.name)
+    return query.limit(limit).all()
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+# Run from anywhere: the app modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'test-password'
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    # One app on a throwaway SQLite database; create_app reads its config
+    # from the environment, so point everything at a temporary directory
+    root = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f"sqlite:///{root / 'test.db'}")
+        mp.setenv('UPLOAD_FOLDER', str(root / 'uploads'))
+        mp.setenv('SHARED_STATE_DIR', str(root / 'state'))
+        mp.setenv('METRICS_DIR', str(root / 'metrics'))
+        mp.setenv('QR_RENDER_WORKERS', '1')
+        mp.setenv('NOTIFY_ASYNC', '0')
+        mp.delenv('QUERY_BUDGET_ENFORCE', raising=False)
+        from app import create_app
+        app = create_app()
+    app.config.update(TESTING=True)
+
+    from models import db, Admin
+    with app.app_context():
+        db.session.add(Admin(username=ADMIN_USERNAME, password_hash=generate_password_hash(ADMIN_PASSWORD)))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    response = client.post('/admin/login', data={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+    assert response.status_code == 302
+    return client
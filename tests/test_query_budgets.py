@@ -0,0 +1,77 @@
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import pytest
+
+from models import (db, User, Reward, QRBatch, QRCode, RedemptionRequest, Transaction,
+                    Notification, SupportMessage, WebsiteContact)
+from services.dashboard import dashboard_stats
+
+# Requests every view that declares a query budget. TESTING turns
+# QUERY_BUDGET_ENFORCE on, so a view that runs more statements than its
+# @query_budget raises QueryBudgetExceeded and fails its test. The dashboard
+# stats cache is cleared before each request, since a cold cache is the
+# expensive case. Several rows per list make an N+1 show up as a breach.
+
+ROWS = 3
+
+BUDGETED_URLS = [
+    '/admin/dashboard',
+    '/admin/stats/daily',
+    '/admin/ledger/report',
+    '/admin/users',
+    '/admin/user/{user_id}',
+    '/admin/user/{user_id}/transactions',
+    '/admin/user/{user_id}/redemptions',
+    '/admin/user/{user_id}/messages',
+    '/admin/qr-batch/{batch_id}',
+    '/admin/qr-batch/{batch_id}/analytics',
+    '/admin/redemptions',
+    '/admin/support-messages',
+    '/admin/website-contacts',
+    '/api/wallet/transactions?user_id={user_id}',
+    '/api/content/notifications?user_id={user_id}',
+    '/api/rewards/history?user_id={user_id}',
+]
+
+
+@pytest.fixture(scope='module')
+def ids(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        users = [User(name=f"Customer {i}", phone=f"90000000{i}", password_hash='-', points=100, state='Goa')
+                 for i in range(ROWS)]
+        reward = Reward(name='Cap', points_required=10, stock=10)
+        batch = QRBatch(batch_name='Budget batch', total_qrs=ROWS * 2, total_points=ROWS * 20)
+        db.session.add_all(users + [reward, batch])
+        db.session.flush()
+        for i, user in enumerate(users):
+            db.session.add_all([
+                QRCode(batch_id=batch.id, points=10, is_redeemed=True, redeemed_by=user.id, redeemed_at=now),
+                QRCode(batch_id=batch.id, points=10),
+                RedemptionRequest(user_id=user.id, reward_id=reward.id),
+                Transaction(user_id=user.id, amount=10, type='earn', description='Scan'),
+                Transaction(user_id=user.id, amount=-10, type='spend', description='Redeem'),
+                Notification(user_id=user.id, title='Hi', message='Hello'),
+                Notification(user_id=user.id, title='Alert', message='Scan', is_admin_alert=True),
+                SupportMessage(user_id=user.id, subject='Help', message='Question'),
+                WebsiteContact(full_name=f"Visitor {i}", email=f"visitor{i}@example.com",
+                               number=f"80000000{i}", message='Hello'),
+            ])
+        db.session.commit()
+        return {'user_id': users[0].id, 'batch_id': batch.id}
+
+
+@pytest.mark.parametrize('url', BUDGETED_URLS)
+def test_within_query_budget(app, admin_client, ids, url):
+    dashboard_stats.invalidate()
+    response = admin_client.get(url.format(**ids))
+    assert response.status_code == 200
+
+
+def test_every_budgeted_view_is_covered(app):
+    budgeted = {endpoint for endpoint, view in app.view_functions.items() if hasattr(view, '_query_budget')}
+    budgeted |= set(app.config.get('QUERY_BUDGETS') or {})
+    adapter = app.url_map.bind('localhost')
+    covered = {adapter.match(urlsplit(url.format(user_id=1, batch_id=1)).path)[0] for url in BUDGETED_URLS}
+    assert budgeted <= covered, f"add a URL for {sorted(budgeted - covered)} to BUDGETED_URLS"